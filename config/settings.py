@@ -4,7 +4,6 @@ import os
 from pathlib import Path
 from django.core.exceptions import ImproperlyConfigured
 
-import cloudinary
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -61,7 +60,6 @@ INSTALLED_APPS = [
     "corsheaders",
     "rest_framework",
     "rest_framework.authtoken",
-    "rest_framework_simplejwt",
     "ckeditor",
     "ckeditor_uploader",
 
@@ -71,20 +69,32 @@ INSTALLED_APPS = [
     "product.apps.ProductConfig",
 ]
 
+# The admin (jazzmin, ckeditor uploads) is only loaded by processes that
+# serve it; the job worker and API-only web processes can switch it off.
+ADMIN_ENABLED = os.environ.get("DJANGO_ADMIN_ENABLED", "True") == "True"
+if not ADMIN_ENABLED:
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS
+        if app not in ("jazzmin", "django.contrib.admin", "ckeditor_uploader")
+    ]
+
 # =========================
 # MIDDLEWARE
 # =========================
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "product.middleware.APICompressionMiddleware",
 
     "corsheaders.middleware.CorsMiddleware",
+    "product.middleware.LoadSheddingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "product.middleware.APICacheControlMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -161,27 +171,182 @@ CLOUD_NAME = os.environ.get("CLOUD_NAME")
 API_KEY = os.environ.get("API_KEY")
 API_SECRET = os.environ.get("API_SECRET")
 
+# Read by the cloudinary SDK the first time it is used, so settings don't
+# have to import it.
 if CLOUD_NAME and API_KEY and API_SECRET:
-    cloudinary.config(
-        cloud_name=CLOUD_NAME,
-        api_key=API_KEY,
-        api_secret=API_SECRET,
-    )
+    CLOUDINARY = {
+        "cloud_name": CLOUD_NAME,
+        "api_key": API_KEY,
+        "api_secret": API_SECRET,
+    }
 
 # =========================
 # REST FRAMEWORK
 # =========================
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication"
+        "product.authentication.CachedJWTAuthentication"
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly"
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    "DEFAULT_THROTTLE_CLASSES": [
+        "product.throttling.AnonRateThrottle",
+        "product.throttling.StaffRateThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.environ.get("API_THROTTLE_ANON", "120/min") or None,
+        "staff": os.environ.get("API_THROTTLE_STAFF", "3000/min") or None,
+    },
+    # Proxies in front of the app (Railway's edge is one). Throttles key on the
+    # entry that many hops from the end of X-Forwarded-For, which the client can't
+    # forge; with 0 they use REMOTE_ADDR.
+    "NUM_PROXIES": int(os.environ.get(
+        "NUM_PROXIES", "1" if os.environ.get("RAILWAY_PUBLIC_DOMAIN") else "0"
+    )),
 }
 
+# Opt-in orjson renderer/parser (falls back to DRF's JSON if orjson is missing)
+if os.environ.get("DJANGO_FAST_JSON", "False") == "True":
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = [
+        "product.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ]
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] = [
+        "product.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ]
+
+# =========================
+# CACHE
+# =========================
+# Throttle counters and the JWT user cache must be shared by all workers,
+# so use Redis when it is available; LocMem is per process.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+# =========================
+# LOAD SHEDDING
+# =========================
+# /api/ answers 503 + Retry-After past these limits (0 disables a check).
+# With the sync gunicorn workers from the Procfile only LOAD_SHED_MAX_BUSY_MS
+# applies: each worker runs one request at a time, so in-flight never goes
+# above 1, and Railway's proxy does not send X-Request-Start. Set
+# LOAD_SHED_MAX_QUEUE_MS only behind a proxy configured to add that header.
+# A worker that hasn't been idle for 10s has had requests waiting all along.
+LOAD_SHED_MAX_BUSY_MS = int(os.environ.get("LOAD_SHED_MAX_BUSY_MS", "10000"))
+LOAD_SHED_MAX_IN_FLIGHT = int(os.environ.get("LOAD_SHED_MAX_IN_FLIGHT", "0"))
+LOAD_SHED_MAX_QUEUE_MS = int(os.environ.get("LOAD_SHED_MAX_QUEUE_MS", "0"))
+LOAD_SHED_RETRY_AFTER = int(os.environ.get("LOAD_SHED_RETRY_AFTER", "5"))
+
+# =========================
+# API RESPONSE CACHING / COMPRESSION
+# =========================
+# Anonymous GETs on /api/ are sent as "public" so a CDN can cache them;
+# set API_CACHE_MAX_AGE=0 to turn that off.
+API_CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", "60"))
+API_CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get("API_CACHE_STALE_WHILE_REVALIDATE", "300"))
+API_COMPRESSION_MIN_SIZE = int(os.environ.get("API_COMPRESSION_MIN_SIZE", "1024"))
+
+# =========================
+# CATALOG SNAPSHOT
+# =========================
+# Public product/category/plan reads are served from a pre-rendered copy,
+# stored in the database and rebuilt in the background after catalog changes.
+CATALOG_SNAPSHOT_ENABLED = os.environ.get("CATALOG_SNAPSHOT_ENABLED", "False") == "True"
+# Seconds between checks of the shared snapshot row for a newer version
+CATALOG_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("CATALOG_SNAPSHOT_CHECK_INTERVAL", "1"))
+CATALOG_SNAPSHOT_DEBOUNCE = float(os.environ.get("CATALOG_SNAPSHOT_DEBOUNCE", "2"))
+
+# =========================
+# POPULARITY
+# =========================
+# Product views (POST /api/products/<id>/view/) are counted in memory and
+# written in batches.
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get("VIEW_COUNT_FLUSH_INTERVAL", "30"))
+VIEW_COUNT_FLUSH_SIZE = int(os.environ.get("VIEW_COUNT_FLUSH_SIZE", "500"))
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get("POPULARITY_HALF_LIFE_DAYS", "7"))
+POPULARITY_WINDOW_DAYS = int(os.environ.get("POPULARITY_WINDOW_DAYS", "60"))
+# Seconds between popularity recomputes, queued by `manage.py run_worker`
+POPULARITY_UPDATE_INTERVAL = int(os.environ.get("POPULARITY_UPDATE_INTERVAL", "3600"))
+
+# Upper bound on sub-requests per /api/batch/ call
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "10"))
+
+# How many related products are precomputed per product
+RELATED_PRODUCTS_K = int(os.environ.get("RELATED_PRODUCTS_K", "8"))
+# Seconds between full related-products rebuilds, queued by `manage.py run_worker`
+RELATED_REBUILD_INTERVAL = int(os.environ.get("RELATED_REBUILD_INTERVAL", "86400"))
+
+# =========================
+# SITEMAPS / PRODUCT FEED
+# =========================
+# Stored in the database and served at /sitemap.xml and /feeds/. Catalog
+# changes queue a build of the sections that changed once no further change
+# came in for SEO_BUILD_DELAY seconds; `manage.py build_seo` does it by hand.
+SITE_URL = os.environ.get("SITE_URL", "https://www.toolsology.shop")
+STOREFRONT_PRODUCT_URL = os.environ.get("STOREFRONT_PRODUCT_URL", SITE_URL + "/product/{id}")
+STOREFRONT_CATEGORY_URL = os.environ.get("STOREFRONT_CATEGORY_URL", SITE_URL + "/category/{slug}")
+# Public URL of this backend, which serves the sitemap files the index lists
+SITEMAP_BASE_URL = os.environ.get("SITEMAP_BASE_URL") or (
+    f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}"
+    if os.environ.get("RAILWAY_PUBLIC_DOMAIN") else "http://localhost:8000"
+)
+SITEMAP_CHUNK_SIZE = int(os.environ.get("SITEMAP_CHUNK_SIZE", "10000"))
+SEO_FEED_TITLE = os.environ.get("SEO_FEED_TITLE", "Toolsology products")
+SEO_BUILD_DELAY = int(os.environ.get("SEO_BUILD_DELAY", "60"))
+SEO_MAX_AGE = int(os.environ.get("SEO_MAX_AGE", "3600"))
+
+# =========================
+# TASK QUEUE
+# =========================
+# Jobs live in the main database and run in `manage.py run_worker`.
+# With the queue on, admin image uploads and snapshot rebuilds happen in the
+# worker; the snapshot lives in the database, so that needs no shared disk.
+TASK_QUEUE_ENABLED = os.environ.get("TASK_QUEUE_ENABLED", "False") == "True"
+TASK_QUEUE_VISIBILITY_TIMEOUT = int(os.environ.get("TASK_QUEUE_VISIBILITY_TIMEOUT", "600"))
+TASK_QUEUE_RETRY_BASE = int(os.environ.get("TASK_QUEUE_RETRY_BASE", "10"))
+
+# =========================
+# CACHE PURGE OUTBOX
+# =========================
+# Catalog changes are written to an outbox in the same transaction and
+# dispatched after commit. With CDN_PURGE_URL set, the coalesced API paths
+# are POSTed to it as {"paths": [...], "tags": [...]}, CDN_PURGE_BATCH_SIZE
+# per request. Public /api/ responses list their path (without the query
+# string) in CDN_CACHE_TAG_HEADER, comma-separated, so purging the tags also
+# drops ?page=..., ?category=... and batch variants; "paths" only matches
+# exact URLs.
+CDN_PURGE_URL = os.environ.get("CDN_PURGE_URL", "")
+CDN_PURGE_TOKEN = os.environ.get("CDN_PURGE_TOKEN", "")
+CDN_PURGE_BATCH_SIZE = int(os.environ.get("CDN_PURGE_BATCH_SIZE", "30"))
+CDN_PURGE_TIMEOUT = float(os.environ.get("CDN_PURGE_TIMEOUT", "10"))
+CDN_CACHE_TAG_HEADER = os.environ.get("CDN_CACHE_TAG_HEADER", "Cache-Tag")
+# Wait before purging the CDN until every process has re-checked the catalog
+# snapshot, or the CDN could re-cache a payload rendered from the old one
+CDN_PURGE_DELAY = float(os.environ.get(
+    "CDN_PURGE_DELAY", str(CATALOG_SNAPSHOT_CHECK_INTERVAL + 1)
+))
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_DISPATCH_DELAY = float(os.environ.get("OUTBOX_DISPATCH_DELAY", "1"))
+# Seconds a claimed event is hidden from other dispatchers while purging
+OUTBOX_LEASE = int(os.environ.get("OUTBOX_LEASE", "300"))
+# Failed events are kept (see the admin) but no longer retried after this
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+
 # =========================
 # JWT
 # =========================
@@ -193,6 +358,11 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Seconds an authenticated user is served from the cache instead of auth_user.
+# Off without a shared cache: a per-process delete can't reach other workers,
+# so a demoted staff user would keep write access until the entry expired.
+JWT_USER_CACHE_TTL = int(os.environ.get("JWT_USER_CACHE_TTL", "60" if REDIS_URL else "0"))
+
 # =========================
 # JAZZMIN
 # =========================
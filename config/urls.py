@@ -1,24 +1,48 @@
 
-from django.contrib import admin
-from django.urls import path, include
+from importlib import import_module
+
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from django.views.decorators.csrf import csrf_exempt
+
+from product.views import seo_artifact
+
+
+def lazy_view(dotted_path):
+    """Import a class-based view on its first request instead of at URL load."""
+    view = None
+
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            module_path, class_name = dotted_path.rsplit('.', 1)
+            view = getattr(import_module(module_path), class_name).as_view()
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     # API endpoints from product app
     path('api/', include('product.urls')),
     # JWT authentication endpoints
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path("ckeditor/", include("ckeditor_uploader.urls")),
-
+    path('api/token/', lazy_view('rest_framework_simplejwt.views.TokenObtainPairView'), name='token_obtain_pair'),
+    path('api/token/refresh/', lazy_view('rest_framework_simplejwt.views.TokenRefreshView'), name='token_refresh'),
+    # Sitemaps and product feeds (see product/seo.py)
+    re_path(r'^(?P<name>sitemap(?:-[\w-]+)?\.xml)$', seo_artifact, name='sitemap'),
+    re_path(r'^feeds/(?P<name>products\.(?:xml|json))$', seo_artifact, name='product_feed'),
 ]
 
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('admin/', admin.site.urls),
+        path("ckeditor/", include("ckeditor_uploader.urls")),
+    ]
+
 # Serve media files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
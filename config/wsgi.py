@@ -12,4 +12,11 @@ from django.core.wsgi import get_wsgi_application  # type: ignore
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Load the URLconf (and every view module behind it) now rather than on the
+# first request, so with `gunicorn --preload` it is imported once in the
+# master and shared copy-on-write by the workers.
+from django.urls import get_resolver  # type: ignore  # noqa: E402
+
+get_resolver().url_patterns
\ No newline at end of file
@@ -11,6 +11,15 @@ python manage.py collectstatic --noinput
 # Run migrations
 python manage.py migrate --noinput
 
+# Sanitize rich text / excerpts for rows saved before those columns existed
+python manage.py backfill_rich_text
+
+# Pre-render the public catalog snapshot
+python manage.py build_catalog_snapshot
+
+# Write sitemaps and product feeds (only changed sections after the first run)
+python manage.py build_seo
+
 # Create superuser if not exists (optional)
 echo "from django.contrib.auth import get_user_model; User = get_user_model(); User.objects.filter(username='admin').exists() or User.objects.create_superuser('admin', 'admin@example.com', 'admin123')" | python manage.py shell
 
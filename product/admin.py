@@ -1,5 +1,9 @@
 from django.contrib import admin
-from django.db.models import Count
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 from .models import (
     Product,
     ProductImage,
@@ -7,9 +11,50 @@ from .models import (
     Review,
     WhatsAppSettings,
     ProductPlan,
+    Job,
+    OutboxEvent,
 )
 
 
+# =========================
+# Helpers
+# =========================
+
+def count_subquery(model, fk="product"):
+    """Per-row child count as a correlated subquery (no join fan-out)."""
+    counts = (
+        model.objects.filter(**{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(c=Count("pk"))
+        .values("c")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Use Postgres' planner estimate instead of COUNT(*) for the unfiltered
+    changelist of a large table. Filtered lists still get an exact count.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        connection = connections[qs.db]
+        if connection.vendor == "postgresql" and not qs.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [qs.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
 # =========================
 # Inline Admins
 # =========================
@@ -24,7 +69,8 @@ class ProductPlanInline(admin.TabularInline):
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
-    fields = ("image", "is_main", "ordering")
+    fields = ("image", "upload_status", "is_main", "ordering")
+    readonly_fields = ("upload_status",)
     ordering = ("ordering",)
 
 
@@ -57,6 +103,8 @@ class ProductAdmin(admin.ModelAdmin):
         ReviewInline,
     ]
     ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # ✅ Minimal change: notes show in admin form
     fieldsets = (
@@ -68,15 +116,15 @@ class ProductAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.annotate(
-            _plans_count=Count("plans"),
-            _images_count=Count("images"),
+            _plans_count=count_subquery(ProductPlan),
+            _images_count=count_subquery(ProductImage),
         )
 
-    @admin.display(description="Plans")
+    @admin.display(description="Plans", ordering="_plans_count")
     def plans_count(self, obj):
         return obj._plans_count
 
-    @admin.display(description="Images")
+    @admin.display(description="Images", ordering="_images_count")
     def images_count(self, obj):
         return obj._images_count
 
@@ -97,6 +145,8 @@ class ProductPlanAdmin(admin.ModelAdmin):
     list_filter = ("is_active",)
     search_fields = ("product__title", "title")
     ordering = ("product", "duration_months")
+    list_select_related = ("product",)
+    autocomplete_fields = ("product",)
 
     @admin.display(description="Duration")
     def duration_display(self, obj):
@@ -133,6 +183,8 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ("status", "rating")
     search_fields = ("customer_name", "product__title")
     readonly_fields = ("created_at",)
+    list_select_related = ("product",)
+    autocomplete_fields = ("product",)
 
 
 # =========================
@@ -152,3 +204,36 @@ class WhatsAppSettingsAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+# =========================
+# Background Jobs
+# =========================
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_after", "updated_at")
+    list_filter = ("status", "name")
+    search_fields = ("name", "idempotency_key")
+    readonly_fields = (
+        "name", "payload", "idempotency_key", "attempts", "max_attempts",
+        "locked_at", "last_error", "created_at", "updated_at",
+    )
+    ordering = ("-created_at",)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Undelivered cache purges; rows disappear once dispatched."""
+    list_display = ("topic", "object_id", "attempts", "next_attempt_at", "created_at")
+    list_filter = ("topic",)
+    readonly_fields = (
+        "topic", "object_id", "paths", "purged_locally", "attempts", "next_attempt_at",
+        "last_error", "created_at",
+    )
+
+    def has_add_permission(self, request):
+        return False
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'product'
\ No newline at end of file
+    name = 'product'
+
+    def ready(self):
+        from . import signals  # noqa: F401
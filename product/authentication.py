@@ -0,0 +1,66 @@
+"""
+JWT authentication with the user lookup served from the cache.
+
+Tokens are still fully validated on every request; only the
+``auth_user`` SELECT behind them is cached, for ``JWT_USER_CACHE_TTL``
+seconds, and only the fields authentication and the permission checks
+read (never the password hash). Saving or deleting a user (which covers
+deactivation and ``is_staff`` changes) drops the entry once the change
+commits. The TTL defaults to 0 (no caching) unless a shared cache is
+configured, since a delete in one worker's LocMem can't reach the others.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+CACHED_USER_FIELDS = ("is_active", "is_staff", "is_superuser")
+
+
+def user_cache_key(user_id) -> str:
+    return f"jwt-user:{user_id}"
+
+
+def invalidate_cached_user(user) -> None:
+    cache.delete(user_cache_key(getattr(user, api_settings.USER_ID_FIELD)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that avoids the per-request user query."""
+
+    def cached_fields(self):
+        return ("pk", api_settings.USER_ID_FIELD, self.user_model.USERNAME_FIELD, *CACHED_USER_FIELDS)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        ttl = settings.JWT_USER_CACHE_TTL
+        if ttl <= 0:
+            return self.check_active(self.fetch_user(user_id))
+
+        key = user_cache_key(user_id)
+        fields = cache.get(key)
+        if fields is None:
+            user = self.fetch_user(user_id)
+            cache.set(key, {name: getattr(user, name) for name in self.cached_fields()}, ttl)
+        else:
+            user = self.user_model(**fields)
+            user._state.adding = False
+            user._state.db = "default"
+        return self.check_active(user)
+
+    def fetch_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def check_active(self, user):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
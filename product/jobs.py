@@ -0,0 +1,134 @@
+"""
+A small task queue that uses the main Postgres database as its broker.
+
+Jobs are rows in :class:`~product.models.Job`. ``enqueue`` inserts one in
+the caller's transaction, so a job only becomes visible once the change
+that produced it commits. ``manage.py run_worker`` claims due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers can poll
+the same table without blocking each other.
+
+Tasks are plain functions registered with :func:`task`; they receive the
+job payload as keyword arguments and must be safe to run more than once.
+"""
+from __future__ import annotations
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Register ``func`` as the handler for jobs called ``name``."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key='', delay=0, max_attempts=5):
+    """
+    Queue ``name`` to run after ``delay`` seconds.
+
+    If a pending job with the same idempotency ``key`` already exists no new
+    row is added; its ``run_after`` is pushed back instead, which debounces
+    bursts of identical work into one run.
+    """
+    run_after = timezone.now() + timedelta(seconds=delay)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                payload=payload or {},
+                idempotency_key=key,
+                run_after=run_after,
+                max_attempts=max_attempts,
+            )
+    except IntegrityError:
+        if not key:
+            raise
+    Job.objects.filter(idempotency_key=key, status=Job.PENDING).update(run_after=run_after)
+    return Job.objects.filter(idempotency_key=key, status=Job.PENDING).first()
+
+
+def claim_job():
+    """Lock the next due job and mark it running, or return ``None``."""
+    now = timezone.now()
+    # jobs left "running" by a crashed worker are picked up again
+    stale = now - timedelta(seconds=settings.TASK_QUEUE_VISIBILITY_TIMEOUT)
+    with transaction.atomic():
+        # ...unless that was their last attempt
+        Job.objects.filter(
+            status=Job.RUNNING, locked_at__lt=stale, attempts__gte=F('max_attempts')
+        ).update(
+            status=Job.FAILED,
+            locked_at=None,
+            last_error='Worker stopped responding on the last attempt.',
+            updated_at=now,
+        )
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.PENDING, run_after__lte=now)
+                | Q(status=Job.RUNNING, locked_at__lt=stale, attempts__lt=F('max_attempts'))
+            )
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'locked_at', 'attempts', 'updated_at'])
+    return job
+
+
+def backoff(attempts):
+    return min(settings.TASK_QUEUE_RETRY_BASE * 2 ** (attempts - 1), 3600)
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome."""
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"No task registered as {job.name!r}")
+        func(**job.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts or func is None:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+
+    job.locked_at = None
+    try:
+        with transaction.atomic():
+            job.save(update_fields=['status', 'run_after', 'locked_at', 'last_error', 'updated_at'])
+    except IntegrityError:
+        # a newer pending job with the same key will do the work
+        job.status = Job.DONE
+        job.last_error = 'Superseded by a newer job with the same key.'
+        job.save(update_fields=['status', 'locked_at', 'last_error', 'updated_at'])
+    return job
+
+
+def prune_jobs(older_than_days=7):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff).delete()[0]
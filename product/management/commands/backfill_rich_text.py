@@ -0,0 +1,35 @@
+"""
+Fill the sanitized HTML and excerpt columns for existing products.
+
+    python manage.py backfill_rich_text --batch-size 500
+"""
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute description_html, notes_html and excerpt in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fields = ["description_html", "notes_html", "excerpt"]
+        qs = Product.objects.only("id", "description", "notes", *fields).order_by("id")
+
+        last_id, total = 0, 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for product in batch:
+                product.render_rich_text()
+            # bulk_update skips save(), so updated_at is left alone
+            Product.objects.bulk_update(batch, fields)
+            last_id = batch[-1].id
+            total += len(batch)
+            self.stdout.write(f"{total} products processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} products."))
@@ -0,0 +1,61 @@
+"""
+Benchmark DRF's JSONRenderer against the orjson renderer on the product list.
+
+    python manage.py bench_json --rounds 200
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from product.models import Product
+from product.renderers import ORJSONRenderer, orjson
+from product.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare JSON rendering speed of the stdlib and orjson renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=100)
+        parser.add_argument("--limit", type=int, default=None,
+                            help="Only render the first N active products.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed; nothing to compare.")
+
+        qs = (
+            Product.objects.filter(status=True)
+            .prefetch_related("images", "reviews", "categories", "plans")
+            .order_by("-created_at")
+        )
+        if options["limit"]:
+            qs = qs[:options["limit"]]
+        data = ProductSerializer(qs, many=True).data
+        if not data:
+            raise CommandError("No active products found; seed some first.")
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        expected, actual = stdlib.render(data), fast.render(data)
+        if expected != actual:
+            raise CommandError("orjson output differs from JSONRenderer output.")
+
+        rounds = options["rounds"]
+        results = {}
+        for name, renderer in (("json", stdlib), ("orjson", fast)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                renderer.render(data)
+            results[name] = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{len(data)} products, {len(expected)} bytes, {rounds} rounds"
+        )
+        for name, elapsed in results.items():
+            self.stdout.write(
+                f"{name:>7}: {elapsed * 1000 / rounds:.3f} ms/render"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"speedup: {results['json'] / results['orjson']:.1f}x"
+        ))
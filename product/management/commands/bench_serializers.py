@@ -0,0 +1,66 @@
+"""
+Benchmark the DRF serializers against the read-only fast path.
+
+    python manage.py bench_serializers --rounds 20
+
+Every pair is first checked for identical rendered output.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from product.models import Category, Product, ProductPlan, Review
+from product.serializers import (
+    CategorySerializer,
+    ProductSerializer,
+    ProductPlanSerializer,
+    ReviewSerializer,
+    FastCategorySerializer,
+    FastProductSerializer,
+    FastProductPlanSerializer,
+    FastReviewSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare DRF serializers with the fast read-only serializers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        cases = [
+            (
+                "product",
+                Product.objects.prefetch_related("images", "reviews", "categories", "plans"),
+                ProductSerializer,
+                FastProductSerializer,
+            ),
+            ("category", Category.objects.all(), CategorySerializer, FastCategorySerializer),
+            ("plan", ProductPlan.objects.all(), ProductPlanSerializer, FastProductPlanSerializer),
+            ("review", Review.objects.all(), ReviewSerializer, FastReviewSerializer),
+        ]
+
+        renderer = JSONRenderer()
+        for name, qs, slow, fast in cases:
+            objs = list(qs)
+            if not objs:
+                self.stdout.write(f"{name:>8}: no rows, skipped")
+                continue
+
+            if renderer.render(slow(objs, many=True).data) != renderer.render(fast(objs, many=True).data):
+                raise CommandError(f"{name}: fast serializer output differs from {slow.__name__}")
+
+            rates = []
+            for serializer_class in (slow, fast):
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    serializer_class(objs, many=True).data
+                rates.append(len(objs) * rounds / (time.perf_counter() - start))
+
+            self.stdout.write(
+                f"{name:>8}: {len(objs)} objs, drf {rates[0]:,.0f} obj/s, "
+                f"fast {rates[1]:,.0f} obj/s ({rates[1] / rates[0]:.1f}x)"
+            )
@@ -0,0 +1,16 @@
+"""
+Render the public catalog into the snapshot served by the read API.
+
+    python manage.py build_catalog_snapshot
+"""
+from django.core.management.base import BaseCommand
+
+from product import snapshot
+
+
+class Command(BaseCommand):
+    help = "Build the pre-rendered catalog snapshot."
+
+    def handle(self, *args, **options):
+        version = snapshot.build_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Catalog snapshot {version} stored."))
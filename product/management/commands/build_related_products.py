@@ -0,0 +1,19 @@
+"""
+Recompute the related-products table for the whole catalog.
+
+    python manage.py build_related_products
+
+Category changes are picked up incrementally; run this after bulk price or
+plan changes (or nightly) to refresh the price part of the score.
+"""
+from django.core.management.base import BaseCommand
+
+from product.related import rebuild_related
+
+
+class Command(BaseCommand):
+    help = "Rebuild precomputed related products for every active product."
+
+    def handle(self, *args, **options):
+        rows = rebuild_related()
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} related-product rows."))
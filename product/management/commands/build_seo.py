@@ -0,0 +1,28 @@
+"""
+Write the sitemaps and product feeds served at /sitemap.xml and /feeds/.
+
+    python manage.py build_seo [--force]
+
+Only sections whose products or categories changed since the last run are
+rewritten. Catalog changes queue the same build as a ``build_seo`` job;
+this prebuilds on deploy.
+"""
+from django.core.management.base import BaseCommand
+
+from product import seo
+
+
+class Command(BaseCommand):
+    help = "Incrementally rebuild sitemaps and product feeds."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Rewrite every section, changed or not."
+        )
+
+    def handle(self, *args, **options):
+        changed = seo.build(force=options["force"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rewrote {len(changed)} section(s)"
+            + (f": {', '.join(sorted(changed))}" if changed else "")
+        ))
@@ -0,0 +1,26 @@
+"""
+Deliver pending cache purges from the outbox.
+
+    python manage.py dispatch_outbox
+
+``run_worker`` already does this while idle; use this from cron when no
+worker is running, or to check a CDN_PURGE_URL by hand. CDN purges wait
+CDN_PURGE_DELAY after the local one, so they go out on the following run.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product import outbox
+from product.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = "Dispatch due outbox events (local cache and CDN purges)."
+
+    def handle(self, *args, **options):
+        handled = outbox.dispatch_all()
+        failed = OutboxEvent.objects.filter(attempts__gte=settings.OUTBOX_MAX_ATTEMPTS).count()
+        waiting = OutboxEvent.objects.count() - failed
+        self.stdout.write(self.style.SUCCESS(
+            f"Handled {handled} event(s); {waiting} still waiting, {failed} given up on."
+        ))
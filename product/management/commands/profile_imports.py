@@ -0,0 +1,49 @@
+"""
+Report the slowest imports of a fresh process that loads settings and URLs.
+
+    python manage.py profile_imports --top 25
+    python manage.py profile_imports --sort self
+
+Runs ``python -X importtime`` in a subprocess with the current environment,
+so what it measures is what a gunicorn worker or manage.py call pays.
+"""
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT = "import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns"
+
+
+class Command(BaseCommand):
+    help = "Profile import time of django.setup() plus the URLconf."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--sort", choices=("cumulative", "self"), default="cumulative")
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        rows = []
+        for line in result.stderr.splitlines():
+            # "import time:       123 |       4567 |   package.module"
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+
+        key = 0 if options["sort"] == "self" else 1
+        rows.sort(key=lambda row: row[key], reverse=True)
+        total = sum(row[0] for row in rows)
+
+        self.stdout.write(f"{len(rows)} modules, {total / 1000:.1f} ms total import time")
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for self_us, cumulative_us, name in rows[:options["top"]]:
+            self.stdout.write(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
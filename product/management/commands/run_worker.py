@@ -0,0 +1,66 @@
+"""
+Process background jobs from the database queue.
+
+    python manage.py run_worker
+    python manage.py run_worker --once   # drain due jobs and exit
+
+While idle it also prunes finished jobs, queues ``update_popularity``
+every ``POPULARITY_UPDATE_INTERVAL`` seconds and a full related-products
+rebuild every ``RELATED_REBUILD_INTERVAL`` seconds.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from product import jobs, outbox
+from product import tasks  # noqa: F401  (registers the task functions)
+
+
+class Command(BaseCommand):
+    help = "Run the background job worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once no job is due instead of polling.")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        last_prune = 0.0
+        last_popularity = float("-inf")
+        last_related = float("-inf")
+        while not self.stopping:
+            close_old_connections()
+            job = jobs.claim_job()
+            if job is not None:
+                job = jobs.run_job(job)
+                self.stdout.write(f"{job.name} #{job.pk}: {job.status} (attempt {job.attempts})")
+                continue
+
+            # cache purges a web process didn't get to deliver
+            if outbox.dispatch():
+                continue
+            if options["once"]:
+                break
+            if time.monotonic() - last_prune > 3600:
+                jobs.prune_jobs()
+                last_prune = time.monotonic()
+            if time.monotonic() - last_popularity > settings.POPULARITY_UPDATE_INTERVAL:
+                # keyed, so several workers still queue a single run
+                jobs.enqueue("update_popularity", key="update-popularity")
+                last_popularity = time.monotonic()
+            if time.monotonic() - last_related > settings.RELATED_REBUILD_INTERVAL:
+                # catches anything the incremental rebuilds missed
+                jobs.enqueue("rebuild_all_related", key="rebuild-all-related")
+                last_related = time.monotonic()
+            time.sleep(options["poll_interval"])
+
+    def stop(self, signum, frame):
+        self.stdout.write("Finishing current job, then stopping.")
+        self.stopping = True
@@ -0,0 +1,23 @@
+"""
+Recompute the popularity score behind ``/api/products/?ordering=popular``.
+``run_worker`` queues this every ``POPULARITY_UPDATE_INTERVAL`` seconds; run
+it by hand or from cron when no worker is running.
+
+Views are buffered in the web processes and reach the counter table within
+``VIEW_COUNT_FLUSH_INTERVAL`` seconds; this process has none of its own.
+
+    python manage.py update_popularity
+"""
+from django.core.management.base import BaseCommand
+
+from product import popularity, snapshot
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed product popularity score."
+
+    def handle(self, *args, **options):
+        scored = popularity.update_popularity()
+        # the snapshot carries the popular ordering too
+        snapshot.mark_stale()
+        self.stdout.write(self.style.SUCCESS(f"Popularity updated for {scored} products."))
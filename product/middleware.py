@@ -0,0 +1,206 @@
+"""
+Middleware for the JSON API: compression, cache headers and load shedding.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+API_PREFIX = "/api/"
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header; ``q=0`` means refused."""
+    codings = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+def sends_credentials(request):
+    user = getattr(request, "user", None)
+    return (
+        "HTTP_AUTHORIZATION" in request.META
+        or settings.SESSION_COOKIE_NAME in request.COOKIES
+        or (user is not None and user.is_authenticated)
+    )
+
+
+class APICompressionMiddleware(GZipMiddleware):
+    """
+    Compress ``/api/`` responses above ``API_COMPRESSION_MIN_SIZE`` bytes,
+    with brotli when the client accepts it and the module is installed,
+    otherwise gzip. Static files are left to WhiteNoise.
+
+    Brotli has no header field to hide random bytes in, which is how
+    Django's gzip path mitigates BREACH, so it is only used for requests
+    without credentials: their responses are public catalog data with no
+    secret to recover. Anything sent with a token or session cookie (such
+    as the JWT endpoints' responses) goes through gzip.
+    """
+
+    def process_response(self, request, response):
+        if not request.path.startswith(API_PREFIX):
+            return response
+        if response.streaming:
+            return super().process_response(request, response)
+        if len(response.content) < settings.API_COMPRESSION_MIN_SIZE:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+
+        codings = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        br_q = codings.get("br", 0)
+        gzip_q = codings.get("gzip", codings.get("*", 0))
+        if brotli is None or br_q <= 0 or br_q < gzip_q or sends_credentials(request):
+            if gzip_q <= 0:
+                return response
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli.compress(response.content, quality=5)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
+
+
+class APICacheControlMiddleware(MiddlewareMixin):
+    """
+    Let a CDN cache anonymous ``/api/`` reads; keep anything sent with
+    credentials (JWT header, session, staff) ``private``. Cached responses
+    are tagged with their path, so purging it drops every query string.
+    """
+
+    def process_response(self, request, response):
+        if not request.path.startswith(API_PREFIX):
+            return response
+        if request.method not in ("GET", "HEAD") or response.has_header("Cache-Control"):
+            return response
+
+        if sends_credentials(request):
+            patch_cache_control(response, private=True, max_age=0)
+        elif response.status_code == 200 and settings.API_CACHE_MAX_AGE > 0:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.API_CACHE_MAX_AGE,
+                stale_while_revalidate=settings.API_CACHE_STALE_WHILE_REVALIDATE,
+            )
+            # the outbox purges by these tags; views may set more specific ones
+            response.setdefault(settings.CDN_CACHE_TAG_HEADER, request.path)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+
+class LoadSheddingMiddleware:
+    """
+    Answer ``/api/`` requests with 503 + ``Retry-After`` while the worker is
+    saturated, instead of queueing them in front of the database.
+
+    Three signals are used, each disabled when set to 0:
+
+    * ``LOAD_SHED_MAX_BUSY_MS`` - how long this process has been handling
+      requests back to back. A sync gunicorn worker only ever runs one
+      request, so the queue it falls behind on is the listen backlog, which
+      the app can't see; but while that backlog is non-empty the worker
+      picks up the next request as soon as it finishes one and never goes
+      idle. Shedding once that has lasted too long drains the backlog
+      quickly (a 503 costs next to nothing), and the first idle gap resets it.
+    * ``LOAD_SHED_MAX_IN_FLIGHT`` - concurrent requests in this process.
+      Only meaningful for ASGI or gevent-style workers; sync and gthread
+      workers never run more requests than they have threads.
+    * ``LOAD_SHED_MAX_QUEUE_MS`` - time spent waiting in front of the worker,
+      from an ``X-Request-Start: t=<epoch>`` header, if a proxy sets one.
+    """
+
+    # a shorter pause between two requests means the next one was waiting
+    IDLE_GAP = 0.005
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.in_flight = 0
+        self.busy_since = 0.0
+        self.idle_since = float("-inf")
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        with self.lock:
+            now = time.monotonic()
+            if self.in_flight == 0 and now - self.idle_since >= self.IDLE_GAP:
+                self.busy_since = now
+            self.in_flight += 1
+            in_flight = self.in_flight
+            busy_ms = (now - self.busy_since) * 1000
+        try:
+            if request.path.startswith(API_PREFIX) and self.should_shed(request, in_flight, busy_ms):
+                return self.overloaded_response()
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                if self.in_flight == 0:
+                    self.idle_since = time.monotonic()
+
+    def should_shed(self, request, in_flight, busy_ms):
+        max_busy_ms = settings.LOAD_SHED_MAX_BUSY_MS
+        if max_busy_ms and busy_ms > max_busy_ms:
+            return True
+
+        max_in_flight = settings.LOAD_SHED_MAX_IN_FLIGHT
+        if max_in_flight and in_flight > max_in_flight:
+            return True
+
+        max_queue_ms = settings.LOAD_SHED_MAX_QUEUE_MS
+        if not max_queue_ms:
+            return False
+        queue_ms = request_queue_ms(request)
+        return queue_ms is not None and queue_ms > max_queue_ms
+
+    def overloaded_response(self):
+        response = JsonResponse(
+            {"detail": "Service temporarily overloaded, please retry."}, status=503
+        )
+        response.headers["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+        patch_cache_control(response, no_store=True)
+        return response
+
+
+def request_queue_ms(request):
+    """Milliseconds since the proxy received the request, if it told us."""
+    header = request.META.get("HTTP_X_REQUEST_START", "")
+    value = header[2:] if header.startswith("t=") else header
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    # proxies send seconds, milliseconds or microseconds since the epoch
+    while started > 1e11:
+        started /= 1000
+    return max(time.time() - started, 0) * 1000
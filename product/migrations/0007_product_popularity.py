@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 08:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', '-popularity'], name='product_status_popular_idx'),
+        ),
+        migrations.AddField(
+            model_name='productviewcount',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_counts', to='product.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='productviewcount',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='product_view_count_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_outbox_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(blank=True, default='', max_length=40)),
+                ('data', models.TextField(blank=True, default='')),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('generation', models.PositiveBigIntegerField(default=0)),
+                ('built_generation', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
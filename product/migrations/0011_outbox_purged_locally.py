@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_catalog_snapshot_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='purged_locally',
+            field=models.BooleanField(default=False),
+        ),
+    ]
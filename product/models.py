@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.template.defaultfilters import slugify  # type: ignore
 from ckeditor.fields import RichTextField  # type: ignore
 from cloudinary.models import CloudinaryField
 import re
 from django.core.exceptions import ValidationError
 
+from .richtext import make_excerpt, sanitize_html
+
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
@@ -29,33 +35,84 @@ class Product(models.Model):
     title = models.CharField(max_length=255)
     description = RichTextField()
     notes = RichTextField(blank=True, default="")
+    # derived from description/notes on save, served instead of the raw HTML
+    description_html = models.TextField(blank=True, default="", editable=False)
+    notes_html = models.TextField(blank=True, default="", editable=False)
+    excerpt = models.CharField(max_length=255, blank=True, default="", editable=False)
+    # time-decayed view score, recomputed by `manage.py update_popularity`
+    popularity = models.FloatField(default=0, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     categories = models.ManyToManyField(Category, related_name='products')
     status = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # admin changelist ordering, alone and with the status filter
+            models.Index(fields=['-created_at'], name='product_created_desc_idx'),
+            models.Index(fields=['status', '-created_at'], name='product_status_created_idx'),
+            models.Index(fields=['status', '-popularity'], name='product_status_popular_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.title
 
+    def render_rich_text(self) -> None:
+        self.description_html = sanitize_html(self.description)
+        self.notes_html = sanitize_html(self.notes)
+        self.excerpt = make_excerpt(self.description)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.render_rich_text()
+        elif {"description", "notes"} & set(update_fields):
+            self.render_rich_text()
+            kwargs["update_fields"] = {*update_fields, "description_html", "notes_html", "excerpt"}
+        super().save(*args, **kwargs)
+
+    def public_images(self) -> list:
+        # pending uploads have no file yet; uses the prefetch cache when there is one
+        return [img for img in self.images.all() if img.upload_status == ProductImage.UPLOAD_READY]
+
     def main_image(self) -> str | None:
-        main = self.images.filter(is_main=True).first() or self.images.first()
+        images = self.public_images()
+        main = next((img for img in images if img.is_main), None) or next(iter(images), None)
         return main.image.url if main else None
 
 
 class ProductImage(models.Model):
+    UPLOAD_READY = 'ready'
+    UPLOAD_PENDING = 'pending'
+    UPLOAD_STATUS_CHOICES = [
+        (UPLOAD_READY, 'Uploaded'),
+        (UPLOAD_PENDING, 'Upload pending'),
+    ]
+
     product = models.ForeignKey(
         Product,
         related_name='images',
         on_delete=models.CASCADE
     )
-    image = CloudinaryField('image')
+    # blank while the file is waiting in pending_file for the task worker
+    image = CloudinaryField('image', blank=True)
     is_main = models.BooleanField(default=False)
     ordering = models.PositiveIntegerField(default=0)
+    upload_status = models.CharField(
+        max_length=10, choices=UPLOAD_STATUS_CHOICES, default=UPLOAD_READY, editable=False
+    )
+    pending_file = models.BinaryField(null=True, blank=True, editable=False)
+    pending_name = models.CharField(max_length=255, blank=True, default='', editable=False)
 
     class Meta:
         ordering = ['ordering']
 
+    def clean(self):
+        # the column may be blank, but only while an upload is queued
+        if not self.image and self.upload_status != self.UPLOAD_PENDING:
+            raise ValidationError({'image': 'This field is required.'})
+
     def save(self, *args, **kwargs):
         # ensure only one main image per product
         if self.is_main:
@@ -64,7 +121,31 @@ class ProductImage(models.Model):
                 is_main=True
             ).exclude(pk=self.pk).update(is_main=False)
 
+        # hand new files to the task worker instead of uploading in-request
+        queue_upload = settings.TASK_QUEUE_ENABLED and isinstance(self.image, UploadedFile)
+        if queue_upload:
+            self.image.seek(0)
+            self.pending_file = self.image.read()
+            self.pending_name = self.image.name
+            self.image = ''
+            self.upload_status = self.UPLOAD_PENDING
+
         super().save(*args, **kwargs)
+        self.touch_product()
+
+        if queue_upload:
+            from .jobs import enqueue
+            enqueue('upload_product_image', {'image_id': self.pk}, key=f'product-image:{self.pk}')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.touch_product()
+        return result
+
+    def touch_product(self):
+        # images are part of the product's payloads and feed entry, so they
+        # count as a change to it (sitemap lastmod, feed fingerprints)
+        Product.objects.filter(pk=self.product_id).update(updated_at=timezone.now())
 
     def __str__(self) -> str:
         return f"Image for {self.product.title}"
@@ -90,6 +171,67 @@ class ProductPlan(models.Model):
         return f"{self.product.title} - {self.title}"
 
 
+class CatalogSnapshot(models.Model):
+    """
+    The pre-rendered public catalog (see product/snapshot.py); a single row,
+    kept in the database so web and worker processes share it.
+    """
+    version = models.CharField(max_length=40, blank=True, default='')
+    data = models.TextField(blank=True, default='')
+    built_at = models.DateTimeField(null=True, blank=True)
+    # bumped by every catalog change; the data is current while they match
+    generation = models.PositiveBigIntegerField(default=0)
+    built_generation = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return self.version or "(not built)"
+
+
+class SeoArtifact(models.Model):
+    """
+    One stored sitemap, product feed fragment or build manifest (see
+    product/seo.py), kept in the database so web and worker processes share it.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    content = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ProductViewCount(models.Model):
+    """Detail views per product per day, written in batches by popularity.flush()."""
+    product = models.ForeignKey(Product, related_name='view_counts', on_delete=models.CASCADE)
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_view_count_day_uniq'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id} on {self.day}: {self.views}"
+
+
+class RelatedProduct(models.Model):
+    """Precomputed top-K neighbours of a product, see product/related.py."""
+    product = models.ForeignKey(Product, related_name='related_entries', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='related_product_rank_uniq'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
     customer_name = models.CharField(max_length=255)
@@ -126,3 +268,72 @@ class WhatsAppSettings(models.Model):
 
     def __str__(self):
         return self.whatsapp_number
+
+
+class Job(models.Model):
+    """A unit of background work, claimed by ``manage.py run_worker``."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # at most one *pending* job per key; '' means no key
+    idempotency_key = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=Q(status='pending') & ~Q(idempotency_key=''),
+                name='job_pending_key_uniq',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.status})"
+
+
+class OutboxEvent(models.Model):
+    """
+    A catalog change whose caches still need purging, written in the same
+    transaction as the change itself and deleted once dispatched.
+    """
+    topic = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64, blank=True, default='')
+    # API paths whose cached responses the change affects
+    paths = models.JSONField(default=list)
+    # set once the local caches were purged, so retries only redo the CDN call
+    purged_locally = models.BooleanField(default=False)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='outbox_next_attempt_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.topic} {self.object_id}".strip()
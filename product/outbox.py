@@ -0,0 +1,248 @@
+"""
+Transactional outbox for cache invalidation.
+
+Signal handlers call :func:`record`, which inserts an :class:`OutboxEvent`
+in the same transaction as the catalog change, so a rolled-back change
+leaves nothing behind and a committed one is never lost. After commit a
+debounced background thread runs :func:`dispatch_all`; ``run_worker`` (or
+``manage.py dispatch_outbox`` from cron) sweeps up whatever a crashed
+process left behind.
+
+A dispatch claims a batch of due events in a short ``SKIP LOCKED``
+transaction that also bumps their attempts and leases them for
+``OUTBOX_LEASE`` seconds. Outside any transaction it then marks the
+catalog snapshot stale and queues a sitemap build. ``CDN_PURGE_DELAY``
+seconds later, once every process has stopped serving the old snapshot,
+the events' coalesced paths are POSTed to ``CDN_PURGE_URL`` in chunks of
+``CDN_PURGE_BATCH_SIZE``, as exact paths and as cache tags (which also
+cover their query-string variants). Events are deleted only once every
+chunk succeeded; otherwise they are retried with backoff, up to
+``OUTBOX_MAX_ATTEMPTS`` times, and then left in place (visible in the
+admin) for someone to look at. A crashed dispatcher's events come back
+when the lease runs out, so delivery is at-least-once; both purges are
+idempotent.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import seo, snapshot
+from .jobs import backoff
+from .models import (
+    Category,
+    OutboxEvent,
+    Product,
+    ProductImage,
+    ProductPlan,
+    Review,
+    WhatsAppSettings,
+)
+
+logger = logging.getLogger(__name__)
+
+API = "/api/"
+# topics whose changes show up in the sitemaps or product feed
+SEO_TOPICS = {"product", "productimage", "category"}
+
+
+def paths_for(instance) -> list[str]:
+    """API paths whose cached responses ``instance`` appears in."""
+    if isinstance(instance, Product):
+        return product_paths(instance.pk)
+    if isinstance(instance, (ProductImage, ProductPlan, Review)):
+        paths = product_paths(instance.product_id)
+        if isinstance(instance, ProductPlan):
+            paths += [f"{API}plans/", f"{API}plans/{instance.pk}/"]
+        elif isinstance(instance, Review):
+            paths += [f"{API}reviews/", f"{API}reviews/{instance.pk}/"]
+        return paths
+    if isinstance(instance, Category):
+        paths = [f"{API}categories/", f"{API}categories/{instance.pk}/", f"{API}products/"]
+        # product payloads embed their categories; on delete the links are
+        # already gone, so signals.category_deleting saves them beforehand
+        product_ids = getattr(instance, "_member_product_ids", None)
+        if product_ids is None:
+            product_ids = instance.products.values_list("pk", flat=True)
+        paths += [f"{API}products/{product_id}/" for product_id in product_ids]
+        return paths + [f"{API}batch/"]
+    if isinstance(instance, WhatsAppSettings):
+        return [f"{API}whatsapp/"]
+    return []
+
+
+def product_paths(product_id) -> list[str]:
+    return [
+        f"{API}products/",
+        f"{API}products/{product_id}/",
+        f"{API}products/{product_id}/related/",
+        f"{API}batch/",
+    ]
+
+
+def record(instance) -> None:
+    """Queue cache purges for ``instance`` in the current transaction."""
+    _add(instance._meta.model_name, instance.pk, paths_for(instance))
+
+
+def record_products(product_ids) -> None:
+    for product_id in product_ids:
+        _add("product", product_id, product_paths(product_id))
+
+
+def _add(topic, object_id, paths) -> None:
+    OutboxEvent.objects.create(topic=topic, object_id=str(object_id or ""), paths=paths)
+    transaction.on_commit(schedule_dispatch)
+
+
+# =========================
+# Purging
+# =========================
+
+def purge_local(topics) -> None:
+    snapshot.mark_stale()
+    if topics & SEO_TOPICS:
+        seo.schedule_build()
+
+
+def purge_cdn(paths) -> None:
+    """POST ``{"paths": [...], "tags": [...]}`` to the purge hook; raises on any failure."""
+    if not settings.CDN_PURGE_URL or not paths:
+        return
+    import requests
+
+    headers = {}
+    if settings.CDN_PURGE_TOKEN:
+        headers["Authorization"] = f"Bearer {settings.CDN_PURGE_TOKEN}"
+    size = settings.CDN_PURGE_BATCH_SIZE
+    with requests.Session() as session:
+        for start in range(0, len(paths), size):
+            chunk = paths[start:start + size]
+            response = session.post(
+                settings.CDN_PURGE_URL,
+                # responses are tagged with their path, see APICacheControlMiddleware
+                json={"paths": chunk, "tags": chunk},
+                headers=headers,
+                timeout=settings.CDN_PURGE_TIMEOUT,
+            )
+            response.raise_for_status()
+
+
+# =========================
+# Dispatching
+# =========================
+
+def claim() -> list[OutboxEvent]:
+    """Lease the next batch of due events to this dispatcher."""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by("id")[: settings.OUTBOX_BATCH_SIZE]
+        )
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE),
+        )
+    for event in events:
+        event.attempts += 1
+    return events
+
+
+def dispatch() -> int:
+    """Handle one batch of due events; returns how many were handled."""
+    events = claim()
+    if not events:
+        return 0
+    # no transaction is open here, so no row locks are held during the HTTP calls
+    fresh = [event for event in events if not event.purged_locally]
+    due = [event for event in events if event.purged_locally]
+    failed = []
+
+    if fresh:
+        try:
+            purge_local({event.topic for event in fresh})
+        except Exception as exc:
+            failed += _retry_later(fresh, exc)
+        else:
+            fresh_ids = [event.pk for event in fresh]
+            if settings.CDN_PURGE_URL:
+                # other processes only notice the stale snapshot on their next
+                # check; purged before that, the CDN could re-cache old data
+                delay = settings.CDN_PURGE_DELAY
+                OutboxEvent.objects.filter(pk__in=fresh_ids).update(
+                    purged_locally=True,
+                    attempts=F("attempts") - 1,  # waiting isn't a failed attempt
+                    next_attempt_at=timezone.now() + timedelta(seconds=delay),
+                )
+                _dispatch_later(delay)
+            else:
+                OutboxEvent.objects.filter(pk__in=fresh_ids).delete()
+
+    if due:
+        try:
+            purge_cdn(sorted({path for event in due for path in event.paths}))
+        except Exception as exc:
+            failed += _retry_later(due, exc)
+        else:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in due]).delete()
+    return len(events) - len(failed)
+
+
+def _retry_later(events, exc) -> list[OutboxEvent]:
+    logger.exception("Cache purge for %s outbox events failed", len(events))
+    now = timezone.now()
+    for event in events:
+        event.last_error = repr(exc)
+        event.next_attempt_at = now + timedelta(seconds=backoff(event.attempts))
+    OutboxEvent.objects.bulk_update(events, ["last_error", "next_attempt_at"])
+    given_up = sum(event.attempts >= settings.OUTBOX_MAX_ATTEMPTS for event in events)
+    if given_up:
+        logger.error("Gave up on %s outbox events after %s attempts",
+                     given_up, settings.OUTBOX_MAX_ATTEMPTS)
+    return events
+
+
+def dispatch_all() -> int:
+    total = 0
+    while delivered := dispatch():
+        total += delivered
+    return total
+
+
+_dispatch_lock = threading.Lock()
+_dispatch_timer: threading.Timer | None = None
+
+
+def _dispatch_in_background() -> None:
+    try:
+        dispatch_all()
+    except Exception:
+        logger.exception("Outbox dispatch failed; the worker will retry")
+    finally:
+        connections.close_all()
+
+
+def _dispatch_later(delay) -> None:
+    # not debounced: a newer schedule_dispatch() must not cancel it
+    timer = threading.Timer(delay, _dispatch_in_background)
+    timer.daemon = True
+    timer.start()
+
+
+def schedule_dispatch() -> None:
+    """(Re)start the debounce timer so one burst of changes is one dispatch."""
+    global _dispatch_timer
+    with _dispatch_lock:
+        if _dispatch_timer is not None:
+            _dispatch_timer.cancel()
+        _dispatch_timer = threading.Timer(settings.OUTBOX_DISPATCH_DELAY, _dispatch_in_background)
+        _dispatch_timer.daemon = True
+        _dispatch_timer.start()
@@ -0,0 +1,125 @@
+"""
+Buffered product view counting and the popularity score built from it.
+
+Views come in through ``POST /api/products/<id>/view/``, which storefronts
+call for every product page shown: the detail GET itself is usually
+answered by the CDN and never reaches us.
+
+``record_view`` only bumps an in-process counter. A daemon timer writes
+the buffer to ``ProductViewCount`` at most ``VIEW_COUNT_FLUSH_INTERVAL``
+seconds after its first view (sooner once it holds ``VIEW_COUNT_FLUSH_SIZE``
+distinct products) with a single multi-row upsert, so ``Product`` itself is
+never touched per view and its ``updated_at`` stays meaningful.
+
+``update_popularity`` turns the daily counts into an exponentially decayed
+score on ``Product.popularity``, which backs ``?ordering=popular``.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.utils import timezone
+
+from .models import Product, ProductViewCount
+
+logger = logging.getLogger(__name__)
+
+_buffer: Counter = Counter()
+_lock = threading.Lock()
+_flush_timer: threading.Timer | None = None
+
+
+def record_view(product_id: int) -> None:
+    global _flush_timer
+    with _lock:
+        _buffer[product_id] += 1
+        full = len(_buffer) >= settings.VIEW_COUNT_FLUSH_SIZE
+        if not full and _flush_timer is None:
+            # the buffer is flushed even if no further views arrive
+            _flush_timer = threading.Timer(settings.VIEW_COUNT_FLUSH_INTERVAL, _flush_in_background)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if full:
+        flush()
+
+
+def _flush_in_background() -> None:
+    try:
+        flush()
+    finally:
+        connections.close_all()
+
+
+def flush() -> int:
+    """Write buffered views to the counter table; returns rows upserted."""
+    global _flush_timer
+    with _lock:
+        counts = dict(_buffer)
+        _buffer.clear()
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    if not counts:
+        return 0
+
+    try:
+        try:
+            _upsert(counts)
+        except IntegrityError:
+            # a product was deleted since it was viewed; drop its views
+            existing = set(Product.objects.filter(pk__in=counts).values_list("pk", flat=True))
+            counts = {pk: n for pk, n in counts.items() if pk in existing}
+            if counts:
+                _upsert(counts)
+    except Exception:
+        logger.exception("Could not flush %s buffered product views", len(counts))
+        return 0
+    return len(counts)
+
+
+def _upsert(counts: dict) -> None:
+    table = connection.ops.quote_name(ProductViewCount._meta.db_table)
+    day = timezone.localdate()
+    rows = ", ".join(["(%s, %s, %s)"] * len(counts))
+    params = [value for pk, n in counts.items() for value in (pk, day, n)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (product_id, day, views) VALUES {rows} "
+            f"ON CONFLICT (product_id, day) DO UPDATE SET views = {table}.views + EXCLUDED.views",
+            params,
+        )
+
+
+atexit.register(flush)
+
+
+def update_popularity(now=None) -> int:
+    """
+    Recompute ``Product.popularity`` as the sum of daily views, each halved
+    every ``POPULARITY_HALF_LIFE_DAYS``. Returns the number of scored products.
+    """
+    today = timezone.localdate(now)
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS
+    since = today - timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+
+    scores: dict[int, float] = {}
+    rows = ProductViewCount.objects.filter(day__gte=since).values_list("product_id", "day", "views")
+    for product_id, day, views in rows.iterator():
+        age = (today - day).days
+        scores[product_id] = scores.get(product_id, 0.0) + views * 0.5 ** (age / half_life)
+
+    with transaction.atomic():
+        Product.objects.exclude(pk__in=scores).exclude(popularity=0).update(popularity=0)
+        products = list(Product.objects.filter(pk__in=scores).only("id", "popularity"))
+        for product in products:
+            product.popularity = round(scores[product.pk], 4)
+        # bulk_update skips save(), so updated_at is left alone
+        Product.objects.bulk_update(products, ["popularity"], batch_size=500)
+        ProductViewCount.objects.filter(day__lt=since).delete()
+    return len(products)
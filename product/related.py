@@ -0,0 +1,145 @@
+"""
+Precomputed "related products".
+
+Each active product is scored against the products it shares a category with:
+
+    score = CATEGORY_WEIGHT * jaccard(categories) + PRICE_WEIGHT * price_similarity
+
+Category sets are encoded as integer bitmasks so the overlap of two products
+is one ``&``/``|`` and a popcount, and price similarity is
+``exp(-|ln(a / b)|)`` on the cheapest active plan (or the product price).
+The best ``RELATED_PRODUCTS_K`` per product are stored in ``RelatedProduct``.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+
+from .models import Product, RelatedProduct
+
+CATEGORY_WEIGHT = 0.7
+PRICE_WEIGHT = 0.3
+
+
+class _Catalog:
+    """
+    Category bitmasks and reference prices for active products: all of them,
+    or only ``product_ids`` and the products sharing a category with them.
+    """
+
+    def __init__(self, product_ids=None):
+        through = Product.categories.through
+        products = Product.objects.filter(status=True)
+        if product_ids is not None:
+            categories = through.objects.filter(product_id__in=product_ids).values("category_id")
+            mates = through.objects.filter(category_id__in=categories).values("product_id")
+            products = products.filter(Q(pk__in=product_ids) | Q(pk__in=mates))
+        products = products.annotate(
+            min_plan_price=Min("plans__price", filter=Q(plans__is_active=True))
+        ).values_list("id", "price", "min_plan_price")
+        self.price = {}
+        for pk, price, plan_price in products:
+            ref = plan_price if plan_price is not None else price
+            self.price[pk] = math.log(ref) if ref and ref > 0 else None
+
+        self.mask = defaultdict(int)
+        self.members = defaultdict(set)
+        bits = {}
+        # every category of every loaded product, so the Jaccard unions are complete
+        links = through.objects.filter(product_id__in=list(self.price)).values_list(
+            "product_id", "category_id"
+        )
+        for product_id, category_id in links:
+            bit = bits.setdefault(category_id, len(bits))
+            self.mask[product_id] |= 1 << bit
+            self.members[bit].add(product_id)
+
+    def candidates(self, pk):
+        mask, bit, found = self.mask.get(pk, 0), 0, set()
+        while mask:
+            if mask & 1:
+                found |= self.members[bit]
+            mask >>= 1
+            bit += 1
+        found.discard(pk)
+        return found
+
+    def score(self, a, b):
+        ma, mb = self.mask[a], self.mask[b]
+        jaccard = (ma & mb).bit_count() / (ma | mb).bit_count()
+        pa, pb = self.price[a], self.price[b]
+        price = math.exp(-abs(pa - pb)) if pa is not None and pb is not None else 0.0
+        return CATEGORY_WEIGHT * jaccard + PRICE_WEIGHT * price
+
+    def top_k(self, pk, k):
+        scored = ((self.score(pk, other), other) for other in self.candidates(pk))
+        # ties go to the lower id so results are stable between runs
+        return heapq.nlargest(k, scored, key=lambda item: (item[0], -item[1]))
+
+
+def rebuild_related(product_ids=None) -> int:
+    """
+    Recompute the related list of ``product_ids`` (all products if ``None``).
+    Returns the number of rows written.
+    """
+    if product_ids is not None:
+        product_ids = list(product_ids)
+    catalog = _Catalog(product_ids)
+    k = settings.RELATED_PRODUCTS_K
+    targets = list(catalog.price) if product_ids is None else [
+        pk for pk in product_ids if pk in catalog.price
+    ]
+
+    rows = [
+        RelatedProduct(product_id=pk, related_id=other, rank=rank, score=round(score, 6))
+        for pk in targets
+        for rank, (score, other) in enumerate(catalog.top_k(pk, k), start=1)
+    ]
+    with transaction.atomic():
+        stale = RelatedProduct.objects.all()
+        if product_ids is not None:
+            # also clears lists of products that are no longer active
+            stale = stale.filter(product_id__in=product_ids)
+        stale.delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def affected_by(product_id) -> set:
+    """Products whose related list can change when ``product_id``'s categories do."""
+    category_ids = Product.categories.through.objects.filter(product_id=product_id).values("category_id")
+    sharing = Product.categories.through.objects.filter(category_id__in=category_ids).values_list(
+        "product_id", flat=True
+    )
+    pointing = RelatedProduct.objects.filter(related_id=product_id).values_list("product_id", flat=True)
+    return {product_id, *sharing, *pointing}
+
+
+def rebuild_related_for(product_id) -> int:
+    return rebuild_related(affected_by(product_id))
+
+
+def schedule_rebuild(product_id) -> None:
+    """Rebuild the lists ``product_id``'s categories, status or prices affect."""
+    if settings.TASK_QUEUE_ENABLED:
+        from .jobs import enqueue
+        enqueue("rebuild_related", {"product_id": product_id}, key=f"related:{product_id}")
+    else:
+        transaction.on_commit(lambda: rebuild_related_for(product_id))
+
+
+def schedule_rebuild_of(product_ids) -> None:
+    """Rebuild exactly these lists, e.g. the ones a deleted product was in."""
+    product_ids = sorted(product_ids)
+    if not product_ids:
+        return
+    if settings.TASK_QUEUE_ENABLED:
+        from .jobs import enqueue
+        enqueue("rebuild_related", {"product_ids": product_ids})
+    else:
+        transaction.on_commit(lambda: rebuild_related(product_ids))
@@ -0,0 +1,48 @@
+"""
+Fast JSON renderer backed by orjson.
+
+Produces the same bytes as DRF's ``JSONRenderer`` for the payloads our
+serializers return and falls back to it whenever orjson is not installed
+or the request needs something orjson can't do (indentation, ASCII-only
+output, out-of-range integers).
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+# datetimes go through DRF's encoder so "+00:00" -> "Z" matches exactly
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if orjson is not None else 0
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Drop-in replacement for ``JSONRenderer`` using orjson when available."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # keep output a strict javascript subset, same as JSONRenderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,129 @@
+"""
+Sanitizing and excerpting for the CKEditor rich-text fields.
+
+Everything here runs once when a product is saved (or backfilled), never
+per request. The allow-list mirrors the CKEditor toolbar in settings.
+"""
+from __future__ import annotations
+
+import re
+from html import escape
+from html.parser import HTMLParser
+
+ALLOWED_TAGS = {
+    "p", "br", "strong", "b", "em", "i", "u", "ol", "ul", "li", "a",
+}
+VOID_TAGS = {"br"}
+IMPLICIT_CLOSE_TAGS = {"p", "li"}
+# content of these is dropped entirely, not just the tags
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template"}
+BLOCK_TAGS = {"p", "br", "li", "ol", "ul", "div", "h1", "h2", "h3", "h4", "h5", "h6"}
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:", "tel:", "/", "#")
+
+EXCERPT_LENGTH = 200
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _safe_href(value: str | None) -> str | None:
+    if not value:
+        return None
+    value = value.strip()
+    if value.lower().startswith(SAFE_URL_SCHEMES):
+        return value
+    return None
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html: list[str] = []
+        self.text: list[str] = []
+        self.open_tags: list[str] = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in ALLOWED_TAGS:
+            return
+        if tag in IMPLICIT_CLOSE_TAGS and tag in self.open_tags:
+            # "<li>one<li>two" - an open p/li is closed by the next one
+            self.handle_endtag(tag)
+
+        if tag == "a":
+            href = _safe_href(dict(attrs).get("href"))
+            if href is None:
+                self.html.append("<a>")
+            else:
+                self.html.append(f'<a href="{escape(href)}" rel="nofollow noopener" target="_blank">')
+        else:
+            self.html.append(f"<{tag}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in self.open_tags:
+            return
+        # close anything left open inside this tag so the output stays balanced
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f"</{self.open_tags.pop()}>")
+
+
+def _parse(value: str) -> _Sanitizer:
+    parser = _Sanitizer()
+    parser.feed(value or "")
+    parser.close()
+    return parser
+
+
+def sanitize_html(value: str) -> str:
+    """Return ``value`` with everything outside the allow-list stripped."""
+    return "".join(_parse(value).html)
+
+
+def plain_text(value: str) -> str:
+    """Return the visible text of ``value`` with whitespace collapsed."""
+    return _WHITESPACE_RE.sub(" ", "".join(_parse(value).text)).strip()
+
+
+def make_excerpt(value: str, length: int = EXCERPT_LENGTH) -> str:
+    """Plain-text excerpt of at most ``length`` characters, cut on a word."""
+    text = plain_text(value)
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1].rsplit(" ", 1)[0] or text[:length - 1]
+    return cut.rstrip(" ,.;:") + "…"
@@ -0,0 +1,327 @@
+"""
+Sitemaps and product feeds, stored as :class:`~product.models.SeoArtifact`
+rows so the web processes serve what the worker built without a shared disk.
+
+Artifacts::
+
+    sitemap.xml                   sitemap index
+    sitemap-categories.xml
+    sitemap-products-<n>.xml      products with id in chunk n
+    feed-products-<n>.xml/.json   feed items for chunk n
+    manifest.json                 fingerprint per section from the last build
+
+Products are split into fixed id ranges of ``SITEMAP_CHUNK_SIZE``. A chunk's
+fingerprint is its row count plus its newest ``updated_at``, both read in a
+single grouped query, so a build only rewrites the sitemap and feed items of
+the chunks whose products were added, removed or saved since the last one.
+Saving or deleting a ``ProductImage`` bumps its product's ``updated_at``, so
+image changes count too. ``/feeds/products.{xml,json}`` are assembled from
+the chunks' items while being served, so no change ever rewrites the whole
+feed. Every artifact is streamed row by row, so memory use is bounded by
+the chunk size rather than the catalog.
+
+Builds never run in a request. Once catalog changes are dispatched by the
+outbox, :func:`schedule_build` queues a debounced ``build_seo`` job (or
+starts a background thread without the task queue).
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from xml.sax.saxutils import XMLGenerator, escape
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Category, Product, ProductImage, SeoArtifact
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+FEED_FIELDS = ("id", "title", "description", "link", "image_link", "price", "updated_at")
+
+
+def product_url(product_id) -> str:
+    return settings.STOREFRONT_PRODUCT_URL.format(id=product_id)
+
+
+def category_url(slug) -> str:
+    return settings.STOREFRONT_CATEGORY_URL.format(slug=slug)
+
+
+@contextmanager
+def _artifact(name):
+    buffer = io.StringIO()
+    yield buffer
+    SeoArtifact.objects.update_or_create(name=name, defaults={"content": buffer.getvalue()})
+
+
+def _read(name):
+    return SeoArtifact.objects.filter(name=name).values_list("content", flat=True).first()
+
+
+class _Xml:
+    """Tiny wrapper over XMLGenerator for element-per-call streaming."""
+
+    def __init__(self, fh, document=True):
+        self.out = XMLGenerator(fh, "utf-8", short_empty_elements=True)
+        if document:
+            self.out.startDocument()
+
+    def start(self, name, attrs=None):
+        self.out.startElement(name, attrs or {})
+
+    def end(self, name):
+        self.out.endElement(name)
+
+    def leaf(self, name, text):
+        self.out.startElement(name, {})
+        self.out.characters(str(text))
+        self.out.endElement(name)
+
+
+# =========================
+# Fingerprints
+# =========================
+
+def _public_products():
+    return Product.objects.filter(status=True)
+
+
+def section_fingerprints() -> dict:
+    size = settings.SITEMAP_CHUNK_SIZE
+    chunks = (
+        _public_products()
+        .annotate(chunk=(F("id") - 1) / size)
+        .order_by()
+        .values("chunk")
+        .annotate(n=Count("id"), last=Max("updated_at"))
+    )
+    fingerprints = {
+        f"products-{row['chunk']}": f"{row['n']}:{row['last'].isoformat()}"
+        for row in chunks
+    }
+    categories = Category.objects.filter(status=True).order_by("id").values_list("id", "slug")
+    fingerprints["categories"] = hashlib.sha1(
+        json.dumps(list(categories)).encode()
+    ).hexdigest()
+    return fingerprints
+
+
+# =========================
+# Writers
+# =========================
+
+def _chunk_products(chunk: int):
+    size = settings.SITEMAP_CHUNK_SIZE
+    return _public_products().filter(id__gt=chunk * size, id__lte=(chunk + 1) * size).order_by("id")
+
+
+def write_categories_sitemap() -> None:
+    with _artifact("sitemap-categories.xml") as fh:
+        xml = _Xml(fh)
+        xml.start("urlset", {"xmlns": SITEMAP_NS})
+        for slug in Category.objects.filter(status=True).order_by("id").values_list("slug", flat=True).iterator():
+            xml.start("url")
+            xml.leaf("loc", category_url(slug))
+            xml.end("url")
+        xml.end("urlset")
+        xml.out.endDocument()
+
+
+def write_products_sitemap(chunk: int) -> None:
+    rows = _chunk_products(chunk).values_list("id", "updated_at")
+    with _artifact(f"sitemap-products-{chunk}.xml") as fh:
+        xml = _Xml(fh)
+        xml.start("urlset", {"xmlns": SITEMAP_NS})
+        for product_id, updated_at in rows.iterator(chunk_size=2000):
+            xml.start("url")
+            xml.leaf("loc", product_url(product_id))
+            xml.leaf("lastmod", updated_at.isoformat())
+            xml.end("url")
+        xml.end("urlset")
+        xml.out.endDocument()
+
+
+def _section_order(name):
+    kind, _, chunk = name.partition("-")
+    return kind, int(chunk or 0)
+
+
+def write_sitemap_index(lastmod: dict) -> None:
+    base = settings.SITEMAP_BASE_URL.rstrip("/")
+    with _artifact("sitemap.xml") as fh:
+        xml = _Xml(fh)
+        xml.start("sitemapindex", {"xmlns": SITEMAP_NS})
+        for name in sorted(lastmod, key=_section_order):
+            xml.start("sitemap")
+            xml.leaf("loc", f"{base}/sitemap-{name}.xml")
+            xml.leaf("lastmod", lastmod[name])
+            xml.end("sitemap")
+        xml.end("sitemapindex")
+        xml.out.endDocument()
+
+
+def _feed_rows(chunk: int):
+    # the main image comes from a subquery, so nothing is held per product
+    main_image = (
+        ProductImage.objects.filter(product=OuterRef("pk"), upload_status=ProductImage.UPLOAD_READY)
+        .exclude(image="")
+        .order_by("-is_main", "ordering")
+        .values("image")[:1]
+    )
+    products = (
+        _chunk_products(chunk)
+        .annotate(main_image=Subquery(main_image))
+        .values_list("id", "title", "excerpt", "price", "updated_at", "main_image")
+    )
+    for product_id, title, excerpt, price, updated_at, image in products.iterator(chunk_size=2000):
+        yield {
+            "id": product_id,
+            "title": title,
+            "description": excerpt,
+            "link": product_url(product_id),
+            "image_link": image.url if image else None,
+            "price": f"{price:f}" if price is not None else None,
+            "updated_at": updated_at.isoformat(),
+        }
+
+
+def write_feed_items(chunk: int) -> None:
+    """Write chunk ``chunk``'s ``<item>`` elements and JSON objects."""
+    name = f"feed-products-{chunk}"
+    with _artifact(f"{name}.xml") as xml_fh, _artifact(f"{name}.json") as json_fh:
+        xml = _Xml(xml_fh, document=False)
+        for i, item in enumerate(_feed_rows(chunk)):
+            xml.start("item")
+            for key in FEED_FIELDS:
+                if item[key] is not None:
+                    xml.leaf(key, item[key])
+            xml.end("item")
+            json_fh.write(("," if i else "") + json.dumps(item, ensure_ascii=False))
+
+
+# =========================
+# Serving
+# =========================
+
+def _feed_chunks(suffix):
+    names = SeoArtifact.objects.filter(
+        name__startswith="feed-products-", name__endswith=suffix
+    ).values_list("name", flat=True)
+    # one row at a time, so serving doesn't hold the whole feed either
+    for name in sorted(names, key=lambda n: int(n[len("feed-products-"):-len(suffix)])):
+        content = _read(name)
+        if content:
+            yield content
+
+
+def _feed_xml():
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"><channel>'
+        f"<title>{escape(settings.SEO_FEED_TITLE)}</title>"
+        f"<link>{escape(settings.SITE_URL)}</link>"
+        f"<description>{escape(settings.SEO_FEED_TITLE)}</description>"
+    )
+    yield from _feed_chunks(".xml")
+    yield "</channel></rss>"
+
+
+def _feed_json():
+    yield "["
+    for i, items in enumerate(_feed_chunks(".json")):
+        yield ("," if i else "") + items
+    yield "]"
+
+
+def open_artifact(name):
+    """The content of a public sitemap or feed as an iterable, or ``None``."""
+    if not SeoArtifact.objects.filter(name="manifest.json").exists():
+        return None  # never built
+    if name == "products.xml":
+        return _feed_xml()
+    if name == "products.json":
+        return _feed_json()
+    if name.startswith("sitemap"):
+        content = _read(name)
+        return None if content is None else [content]
+    return None
+
+
+# =========================
+# Build
+# =========================
+
+def build(force=False) -> list[str]:
+    """Rewrite the sections whose fingerprint changed; returns their names."""
+    try:
+        manifest = json.loads(_read("manifest.json") or "")
+        previous, previous_lastmod = manifest["sections"], manifest["lastmod"]
+    except (ValueError, KeyError):
+        previous, previous_lastmod = {}, {}
+
+    now = timezone.now().isoformat()
+    current = section_fingerprints()
+    changed = [name for name, fp in current.items() if force or previous.get(name) != fp]
+    removed = [name for name in previous if name not in current]
+    lastmod = {}
+    for name, fp in current.items():
+        if name.startswith("products-"):
+            lastmod[name] = fp.split(":", 1)[1]  # the chunk's newest updated_at
+        else:
+            lastmod[name] = now if name in changed else previous_lastmod.get(name, now)
+
+    for name in changed:
+        if name == "categories":
+            write_categories_sitemap()
+        else:
+            chunk = int(name.split("-", 1)[1])
+            write_products_sitemap(chunk)
+            write_feed_items(chunk)
+    for name in removed:
+        SeoArtifact.objects.filter(
+            name__in=[f"sitemap-{name}.xml", f"feed-{name}.xml", f"feed-{name}.json"]
+        ).delete()
+
+    if changed or removed or not SeoArtifact.objects.filter(name="sitemap.xml").exists():
+        write_sitemap_index(lastmod)
+
+    # written last, so anything a failed build touched is rewritten next time
+    with _artifact("manifest.json") as fh:
+        json.dump({"built_at": now, "sections": current, "lastmod": lastmod}, fh)
+    return changed + removed
+
+
+_build_lock = threading.Lock()
+_build_timer: threading.Timer | None = None
+
+
+def _build_in_background() -> None:
+    try:
+        build()
+    except Exception:
+        # keep serving the previous artifacts
+        logger.exception("Sitemap/feed build failed")
+    finally:
+        connections.close_all()
+
+
+def schedule_build() -> None:
+    """Queue an incremental build once changes have settled for ``SEO_BUILD_DELAY``."""
+    global _build_timer
+    if settings.TASK_QUEUE_ENABLED:
+        from .jobs import enqueue
+        enqueue("build_seo", key="build-seo", delay=settings.SEO_BUILD_DELAY)
+        return
+    with _build_lock:
+        if _build_timer is not None:
+            _build_timer.cancel()
+        _build_timer = threading.Timer(settings.SEO_BUILD_DELAY, _build_in_background)
+        _build_timer.daemon = True
+        _build_timer.start()
@@ -2,6 +2,10 @@
 Serializers to convert model instances into JSON for API responses and
 to validate incoming data for creation and updates.
 """
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     Category,
@@ -57,13 +61,17 @@ class ProductPlanSerializer(serializers.ModelSerializer):
         ]
 
 
+def is_list_item(serializer):
+    return isinstance(serializer.parent, serializers.ListSerializer)
+
+
 class ProductSerializer(serializers.ModelSerializer):
-    images = ProductImageSerializer(many=True, read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True, source='public_images')
     reviews = ReviewSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
     plans = ProductPlanSerializer(many=True, read_only=True)
     main_image = serializers.SerializerMethodField()
-    
+    excerpt = serializers.CharField(read_only=True)
 
     class Meta:
         model = Product
@@ -71,6 +79,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'id',
             'title',
             'description',
+            'excerpt',
             'price',
             'status',
             'categories',
@@ -83,11 +92,153 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
     def get_main_image(self, obj):
-        img = obj.images.filter(is_main=True).first() or obj.images.first()
-        return img.image.url if img else None
+        return obj.main_image()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if is_list_item(self):
+            # listings show the excerpt; the full HTML is for the detail page
+            data.pop('description')
+        else:
+            # never send the raw editor HTML, only the copy sanitized on save
+            data['description'] = instance.description_html
+        return data
 
 
 class WhatsAppSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = WhatsAppSettings
         fields = ['whatsapp_number']
+
+
+# =========================
+# Read-only fast path
+# =========================
+# The serializers below build the exact same output as the ModelSerializers
+# above, but straight from model attributes: no per-instance field deepcopy
+# and no per-field dispatch. They are only used for safe (read) requests.
+
+CENTS = Decimal('0.01')
+
+
+def _decimal(value):
+    if value is None:
+        return None
+    return '{:f}'.format(value.quantize(CENTS))
+
+
+def _datetime(value):
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _image_url(image):
+    return image.url if image else None
+
+
+def category_to_dict(obj):
+    return {'id': obj.id, 'name': obj.name, 'slug': obj.slug}
+
+
+def image_to_dict(obj):
+    return {
+        'id': obj.id,
+        'image': _image_url(obj.image),
+        'is_main': obj.is_main,
+        'ordering': obj.ordering,
+    }
+
+
+def review_to_dict(obj):
+    return {
+        'id': obj.id,
+        'customer_name': obj.customer_name,
+        'rating': obj.rating,
+        'comment': obj.comment,
+        'created_at': _datetime(obj.created_at),
+    }
+
+
+def plan_to_dict(obj):
+    return {
+        'id': obj.id,
+        'title': obj.title,
+        'duration_months': obj.duration_months,
+        'price': _decimal(obj.price),
+    }
+
+
+# only rendered on the detail endpoint, never in listings
+PRODUCT_DETAIL_ONLY = ('description',)
+
+
+def product_to_dict(obj, detail=True):
+    # relies on images/reviews/categories/plans being prefetched
+    images = obj.public_images()
+    main = next((img for img in images if img.is_main), None)
+    if main is None and images:
+        main = images[0]
+    data = {
+        'id': obj.id,
+        'title': obj.title,
+        'description': obj.description_html,
+        'excerpt': obj.excerpt,
+        'price': _decimal(obj.price),
+        'status': obj.status,
+        'categories': [category_to_dict(c) for c in obj.categories.all()],
+        'images': [image_to_dict(img) for img in images],
+        'main_image': _image_url(main.image) if main else None,
+        'reviews': [review_to_dict(r) for r in obj.reviews.all()],
+        'plans': [plan_to_dict(p) for p in obj.plans.all()],
+        'created_at': _datetime(obj.created_at),
+        'updated_at': _datetime(obj.updated_at),
+    }
+    return data if detail else product_list_item(data)
+
+
+def product_list_item(data):
+    """The listing form of a detail ``product_to_dict`` payload."""
+    return {key: value for key, value in data.items() if key not in PRODUCT_DETAIL_ONLY}
+
+
+def related_to_dict(row):
+    # row comes from RelatedProduct .values(), see ProductViewSet.related
+    return {
+        'id': row['related_id'],
+        'title': row['related__title'],
+        'excerpt': row['related__excerpt'],
+        'price': _decimal(row['related__price']),
+        'main_image': _image_url(row['main_image']),
+        'score': row['score'],
+    }
+
+
+class FastReadSerializer(serializers.BaseSerializer):
+    """Read-only serializer driven by a plain ``obj -> dict`` function."""
+    to_dict = None
+
+    def to_representation(self, instance):
+        return self.to_dict(instance)
+
+
+class FastCategorySerializer(FastReadSerializer):
+    to_dict = staticmethod(category_to_dict)
+
+
+class FastReviewSerializer(FastReadSerializer):
+    to_dict = staticmethod(review_to_dict)
+
+
+class FastProductPlanSerializer(FastReadSerializer):
+    to_dict = staticmethod(plan_to_dict)
+
+
+class FastProductSerializer(FastReadSerializer):
+    def to_representation(self, instance):
+        return product_to_dict(instance, detail=not is_list_item(self))
@@ -0,0 +1,75 @@
+"""
+Signal handlers that keep derived catalog data in sync with the models.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import outbox, related
+from .models import Category, Product, ProductImage, ProductPlan, Review, WhatsAppSettings
+
+# every model whose changes invalidate cached public payloads
+CATALOG_MODELS = (Product, ProductImage, ProductPlan, Category, Review, WhatsAppSettings)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def catalog_changed(sender, instance, **kwargs):
+    if sender in CATALOG_MODELS:
+        # purged by the outbox dispatcher once the transaction commits
+        outbox.record(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductPlan)
+@receiver(post_delete, sender=ProductPlan)
+def related_inputs_changed(sender, instance, **kwargs):
+    # status and (plan) prices feed the related scores too, not only categories
+    related.schedule_rebuild(instance.pk if sender is Product else instance.product_id)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # once deleted, its category links and the lists it appeared in are gone
+    instance._related_affected = related.affected_by(instance.pk) - {instance.pk}
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    related.schedule_rebuild_of(instance.__dict__.pop("_related_affected", ()))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # the product links are deleted before post_delete; outbox.paths_for needs them
+    instance._member_product_ids = list(instance.products.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # post_clear gets pk_set=None, so remember which products lose the category
+        instance._cleared_product_ids = list(instance.products.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # reverse: category.products.add(...), pk_set holds product ids
+    if not reverse:
+        product_ids = (instance.pk,)
+    elif action == "post_clear":
+        product_ids = instance.__dict__.pop("_cleared_product_ids", ())
+    else:
+        product_ids = pk_set or ()
+    outbox.record_products(product_ids)
+    for product_id in product_ids:
+        related.schedule_rebuild(product_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    # imported here so loading the app doesn't pull in simplejwt
+    from .authentication import invalidate_cached_user
+    # after commit, so a concurrent request can't re-cache the old row
+    transaction.on_commit(lambda: invalidate_cached_user(instance))
@@ -0,0 +1,230 @@
+"""
+Pre-rendered catalog snapshot.
+
+The public product, category and plan payloads are rendered into a single
+JSON document stored in the :class:`~product.models.CatalogSnapshot` row,
+which web and worker processes share even when they don't share a disk.
+Every process loads it into an in-memory :class:`CatalogIndex`, and read
+endpoints serve list, filter and detail lookups from that index.
+
+Once a catalog change commits, the outbox dispatcher calls
+:func:`mark_stale`, which bumps the row's ``generation`` (so every process
+falls back to the ORM on its next check) and schedules a debounced rebuild:
+a ``rebuild_catalog_snapshot`` job when the task queue is enabled,
+otherwise a background thread. A build records the generation it started
+from, so it only counts as current if nothing changed while it ran.
+
+Readers re-check the row at most every ``CATALOG_SNAPSHOT_CHECK_INTERVAL``
+seconds with one small query; the document itself is only fetched when
+its version changes.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogSnapshot, Category, Product, ProductPlan
+from .serializers import (
+    category_to_dict,
+    plan_to_dict,
+    product_list_item,
+    product_to_dict,
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PK = 1
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "CATALOG_SNAPSHOT_ENABLED", False)
+
+
+# =========================
+# Building
+# =========================
+
+def render_catalog() -> dict:
+    """Render every public section exactly as the read endpoints would."""
+    products = (
+        Product.objects.filter(status=True)
+        .prefetch_related("images", "reviews", "categories", "plans")
+        .order_by("id")
+    )
+    categories = Category.objects.filter(status=True).order_by("id")
+    plans = ProductPlan.objects.filter(is_active=True).order_by("duration_months", "id")
+    popular = (
+        Product.objects.filter(status=True)
+        .order_by("-popularity", "-id")
+        .values_list("id", flat=True)
+    )
+    return {
+        "products": [product_to_dict(p) for p in products],
+        "popular": list(popular),
+        "categories": [category_to_dict(c) for c in categories],
+        "plans": [dict(plan_to_dict(p), product_id=p.product_id) for p in plans],
+    }
+
+
+def build_snapshot() -> str:
+    """Render the catalog and replace the stored snapshot."""
+    row, _ = CatalogSnapshot.objects.get_or_create(pk=SNAPSHOT_PK)
+    generation = row.generation
+    started = timezone.now()
+    sections = render_catalog()
+    body = json.dumps(sections, separators=(",", ":"), ensure_ascii=False)
+    version = hashlib.sha1(body.encode()).hexdigest()[:12]
+
+    # a build that started from a later generation may have finished first;
+    # never replace its data with this older render
+    written = CatalogSnapshot.objects.filter(
+        pk=SNAPSHOT_PK, built_generation__lte=generation
+    ).update(
+        version=version,
+        data=f'{{"version":"{version}","built_at":{started.timestamp()},"sections":{body}}}',
+        built_at=started,
+        # if mark_stale ran while rendering, generation has moved on and
+        # the snapshot stays stale until the rebuild that it scheduled
+        built_generation=generation,
+    )
+    if not written:
+        logger.info("Discarded catalog snapshot %s; a newer build already landed", version)
+    _expire_check()
+    return version
+
+
+# =========================
+# Invalidation
+# =========================
+
+_rebuild_lock = threading.Lock()
+_rebuild_timer: threading.Timer | None = None
+
+
+def _rebuild_in_background() -> None:
+    try:
+        version = build_snapshot()
+        logger.info("Catalog snapshot rebuilt (version %s)", version)
+    except Exception:
+        logger.exception("Catalog snapshot rebuild failed; serving from the ORM")
+    finally:
+        connections.close_all()
+
+
+def schedule_rebuild() -> None:
+    """(Re)start the debounce timer; the rebuild runs once changes settle."""
+    global _rebuild_timer
+    with _rebuild_lock:
+        if _rebuild_timer is not None:
+            _rebuild_timer.cancel()
+        _rebuild_timer = threading.Timer(
+            settings.CATALOG_SNAPSHOT_DEBOUNCE, _rebuild_in_background
+        )
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
+
+
+def mark_stale() -> None:
+    """Make every process stop trusting the snapshot and queue a rebuild."""
+    if not is_enabled():
+        return
+    CatalogSnapshot.objects.filter(pk=SNAPSHOT_PK).update(generation=F("generation") + 1)
+    _expire_check()
+    if settings.TASK_QUEUE_ENABLED:
+        from .jobs import enqueue
+        enqueue(
+            "rebuild_catalog_snapshot",
+            key="catalog-snapshot",
+            delay=settings.CATALOG_SNAPSHOT_DEBOUNCE,
+        )
+    else:
+        transaction.on_commit(schedule_rebuild)
+
+
+# =========================
+# Reading
+# =========================
+
+class CatalogIndex:
+    """In-memory lookups over one snapshot version."""
+
+    def __init__(self, data: dict):
+        sections = data["sections"]
+        self.version = data["version"]
+
+        # stored in detail form; listings get the same dicts minus the HTML
+        self.products_by_id = {p["id"]: p for p in sections["products"]}
+        self.products = [product_list_item(p) for p in sections["products"]]
+        listed = {p["id"]: p for p in self.products}
+        self.products_popular = [listed[pk] for pk in sections["popular"]]
+        self.products_by_category = defaultdict(list)
+        for product in self.products:
+            for category in product["categories"]:
+                self.products_by_category[category["slug"]].append(product)
+
+        self.categories = sections["categories"]
+        self.categories_by_id = {c["id"]: c for c in self.categories}
+
+        # product_id is only kept for filtering, it isn't part of the payload
+        self.plans = []
+        self.plans_by_product = defaultdict(list)
+        for plan in sections["plans"]:
+            product_id = plan.pop("product_id")
+            self.plans.append(plan)
+            self.plans_by_product[product_id].append(plan)
+        self.plans_by_id = {p["id"]: p for p in self.plans}
+
+
+_index: CatalogIndex | None = None
+_loaded_version = ""
+_current: CatalogIndex | None = None
+_checked_at = float("-inf")
+_index_lock = threading.Lock()
+
+
+def _expire_check() -> None:
+    """Make this process re-read the snapshot row on its next request."""
+    global _checked_at
+    _checked_at = float("-inf")
+
+
+def get_index() -> CatalogIndex | None:
+    """Return the current index, or ``None`` if the ORM must be used."""
+    global _index, _loaded_version, _current, _checked_at
+    if not is_enabled():
+        return None
+    if time.monotonic() - _checked_at < settings.CATALOG_SNAPSHOT_CHECK_INTERVAL:
+        return _current
+
+    with _index_lock:
+        if time.monotonic() - _checked_at < settings.CATALOG_SNAPSHOT_CHECK_INTERVAL:
+            return _current
+        state = (
+            CatalogSnapshot.objects.filter(pk=SNAPSHOT_PK)
+            .values_list("version", "generation", "built_generation")
+            .first()
+        )
+        if state is None or not state[0] or state[1] != state[2]:
+            _current = None
+        else:
+            if state[0] != _loaded_version:
+                data = CatalogSnapshot.objects.filter(pk=SNAPSHOT_PK).values_list("data", flat=True).first()
+                try:
+                    _index = CatalogIndex(json.loads(data))
+                except (TypeError, ValueError, KeyError):
+                    # e.g. written by an older release; ORM until it's rebuilt
+                    logger.exception("Could not load catalog snapshot %s", state[0])
+                    _index = None
+                _loaded_version = state[0]
+            _current = _index
+        _checked_at = time.monotonic()
+    return _current
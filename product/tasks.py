@@ -0,0 +1,53 @@
+"""
+Background tasks run by ``manage.py run_worker``.
+"""
+from cloudinary import uploader
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from . import popularity, related, seo, snapshot
+from .jobs import task
+from .models import ProductImage
+
+
+@task('upload_product_image')
+def upload_product_image(image_id):
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or image.upload_status != ProductImage.UPLOAD_PENDING:
+        return  # deleted, or already uploaded by an earlier attempt
+
+    field = ProductImage._meta.get_field('image')
+    upload = SimpleUploadedFile(image.pending_name, bytes(image.pending_file))
+    image.image = uploader.upload_resource(upload, type=field.type, resource_type=field.resource_type)
+    image.upload_status = ProductImage.UPLOAD_READY
+    image.pending_file = None
+    image.pending_name = ''
+    image.save(update_fields=['image', 'upload_status', 'pending_file', 'pending_name'])
+
+
+@task('rebuild_catalog_snapshot')
+def rebuild_catalog_snapshot():
+    snapshot.build_snapshot()
+
+
+@task('update_popularity')
+def update_popularity():
+    popularity.update_popularity()
+    snapshot.mark_stale()
+
+
+@task('rebuild_related')
+def rebuild_related(product_id=None, product_ids=None):
+    if product_ids is not None:
+        related.rebuild_related(product_ids)
+    else:
+        related.rebuild_related_for(product_id)
+
+
+@task('rebuild_all_related')
+def rebuild_all_related():
+    related.rebuild_related()
+
+
+@task('build_seo')
+def build_seo():
+    seo.build()
@@ -0,0 +1,552 @@
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import outbox, popularity, seo, snapshot
+from .jobs import claim_job
+from .related import rebuild_related
+from .middleware import LoadSheddingMiddleware, accepted_encodings, brotli
+from .models import (
+    CatalogSnapshot,
+    Category,
+    Job,
+    OutboxEvent,
+    Product,
+    ProductImage,
+    ProductPlan,
+    ProductViewCount,
+    RelatedProduct,
+    Review,
+    SeoArtifact,
+)
+from .serializers import (
+    CategorySerializer,
+    FastCategorySerializer,
+    FastProductPlanSerializer,
+    FastProductSerializer,
+    FastReviewSerializer,
+    ProductPlanSerializer,
+    ProductSerializer,
+    ReviewSerializer,
+)
+from .throttling import AnonRateThrottle
+
+
+def make_catalog():
+    """A small catalog touching every nested field the serializers render."""
+    tools = Category.objects.create(name="Design Tools")
+    ai = Category.objects.create(name="AI & ML")
+    products = []
+    for i in range(3):
+        product = Product.objects.create(
+            title=f"Product {i}",
+            description=f"<p>Hello <b>world</b> {i}</p><script>x()</script>",
+            price=Decimal("9.5") * (i + 1) if i != 2 else None,
+        )
+        product.categories.add(tools, *([ai] if i % 2 else []))
+        ProductImage.objects.create(product=product, image=f"sample/p{i}-a", ordering=1)
+        ProductImage.objects.create(product=product, image=f"sample/p{i}-b", ordering=0, is_main=(i == 0))
+        ProductPlan.objects.create(product=product, title="Monthly", duration_months=1, price=Decimal("3"))
+        ProductPlan.objects.create(product=product, title="Yearly", duration_months=12, price=Decimal("30.25"))
+        Review.objects.create(product=product, customer_name="Ana", rating=5, comment="Great")
+        Review.objects.create(product=product, customer_name="Bo", rating=3, comment="Fine")
+        products.append(product)
+    return products
+
+
+class FastSerializerTests(TestCase):
+    """The read fast path must render exactly what the ModelSerializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_catalog()
+
+    def product_queryset(self):
+        return (
+            Product.objects.filter(status=True)
+            .prefetch_related("images", "reviews", "categories", "plans")
+            .order_by("id")
+        )
+
+    def test_product_list_and_detail(self):
+        qs = self.product_queryset()
+        self.assertEqual(
+            FastProductSerializer(qs, many=True).data,
+            ProductSerializer(qs, many=True).data,
+        )
+        product = qs.get(pk=self.products[1].pk)
+        self.assertEqual(FastProductSerializer(product).data, ProductSerializer(product).data)
+
+    def test_description_only_on_detail(self):
+        qs = self.product_queryset()
+        for serializer in (FastProductSerializer, ProductSerializer):
+            with self.subTest(serializer=serializer.__name__):
+                self.assertTrue(all("description" not in item for item in serializer(qs, many=True).data))
+                detail = serializer(qs.get(pk=self.products[0].pk)).data
+                self.assertEqual(detail["description"], "<p>Hello <b>world</b> 0</p>")
+
+    def test_nested_serializers(self):
+        for fast, model_serializer, qs in (
+            (FastCategorySerializer, CategorySerializer, Category.objects.order_by("id")),
+            (FastReviewSerializer, ReviewSerializer, Review.objects.order_by("id")),
+            (FastProductPlanSerializer, ProductPlanSerializer, ProductPlan.objects.order_by("id")),
+        ):
+            with self.subTest(serializer=fast.__name__):
+                self.assertEqual(fast(qs, many=True).data, model_serializer(qs, many=True).data)
+
+    def test_api_matches_model_serializer(self):
+        client = APIClient()
+        expected = ProductSerializer(self.product_queryset(), many=True).data
+
+        response = client.get("/api/products/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [dict(item) for item in expected])
+
+        product = self.products[0]
+        response = client.get(f"/api/products/{product.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            dict(ProductSerializer(self.product_queryset().get(pk=product.pk)).data),
+        )
+
+
+@override_settings(CATALOG_SNAPSHOT_ENABLED=True, TASK_QUEUE_ENABLED=False)
+class CatalogSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_catalog()
+
+    def setUp(self):
+        snapshot._expire_check()
+
+    def test_older_build_does_not_overwrite_newer(self):
+        render = snapshot.render_catalog
+        newer = {}
+
+        def render_while_newer_build_lands():
+            # a change and a complete rebuild happen while this render runs
+            sections = render()
+            CatalogSnapshot.objects.filter(pk=snapshot.SNAPSHOT_PK).update(generation=F("generation") + 1)
+            with mock.patch.object(snapshot, "render_catalog", render):
+                newer["version"] = snapshot.build_snapshot()
+            sections["categories"] = []
+            return sections
+
+        with mock.patch.object(snapshot, "render_catalog", render_while_newer_build_lands):
+            older = snapshot.build_snapshot()
+
+        row = CatalogSnapshot.objects.get(pk=snapshot.SNAPSHOT_PK)
+        self.assertNotEqual(older, newer["version"])
+        self.assertEqual(row.version, newer["version"])
+        self.assertEqual(row.built_generation, row.generation)
+
+    def test_orm_fallback_matches_snapshot_order(self):
+        client = APIClient()
+        fallback = client.get("/api/products/").json()["results"]
+        product_id = self.products[0].pk
+        fallback_detail = client.get(f"/api/products/{product_id}/").json()
+        snapshot.build_snapshot()
+        self.assertIsNotNone(snapshot.get_index())
+        self.assertEqual(client.get("/api/products/").json()["results"], fallback)
+        self.assertEqual(client.get(f"/api/products/{product_id}/").json(), fallback_detail)
+        self.assertIn("description", fallback_detail)
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog()
+
+    def get(self, accept_encoding, **extra):
+        return APIClient().get("/api/products/", HTTP_ACCEPT_ENCODING=accept_encoding, **extra)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            accepted_encodings("gzip, br;q=0, deflate; q=0.5, identity;q=x"),
+            {"gzip": 1.0, "br": 0.0, "deflate": 0.5, "identity": 0.0},
+        )
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_negotiation(self):
+        for accept_encoding, expected in (
+            ("gzip, br", "br"),
+            ("gzip, br;q=0", "gzip"),
+            ("gzip;q=1, br;q=0.5", "gzip"),
+            ("br;q=0", None),
+            ("gzip;q=0", None),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(self.get(accept_encoding).get("Content-Encoding"), expected)
+
+    def test_credentialed_responses_use_gzip(self):
+        client = APIClient()
+        client.force_login(get_user_model().objects.create_user("staff", password="x", is_staff=True))
+        response = client.get("/api/products/", HTTP_ACCEPT_ENCODING="br, gzip")
+        self.assertEqual(response.get("Content-Encoding"), "gzip")
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def hit(self, now):
+        request = Request(APIRequestFactory().get("/api/products/"))
+        request.user = AnonymousUser()
+        throttle = AnonRateThrottle()
+        throttle.rate = "5/min"
+        throttle.num_requests, throttle.duration = throttle.parse_rate(throttle.rate)
+        throttle.timer = lambda: now
+        return throttle.allow_request(request, None), throttle.wait()
+
+    def test_gcra_allows_a_burst_then_the_steady_rate(self):
+        self.assertEqual([self.hit(1000)[0] for _ in range(6)], [True] * 5 + [False])
+        self.assertEqual(self.hit(1000), (False, 12.0))
+        # one request every 60 / 5 seconds after the burst
+        self.assertEqual(self.hit(1012), (True, 0.0))
+        self.assertEqual(self.hit(1012), (False, 12.0))
+        self.assertTrue(self.hit(1012 + 60)[0])
+
+
+class LoadSheddingTests(TestCase):
+    def test_sheds_while_the_worker_never_goes_idle(self):
+        clock = [100.0]
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+
+        def request(seconds):
+            def get_response(request):
+                clock[0] += seconds
+                return HttpResponse()
+            middleware.get_response = get_response
+            return middleware(RequestFactory().get("/api/products/")).status_code
+
+        with mock.patch("product.middleware.time.monotonic", lambda: clock[0]), \
+                self.settings(LOAD_SHED_MAX_BUSY_MS=1000):
+            # back to back, no idle gap: busy for 1.2s by the fifth request
+            self.assertEqual([request(0.3) for _ in range(5)], [200] * 4 + [503])
+            clock[0] += 1
+            self.assertEqual(request(0.3), 200)
+
+
+class ProductImageTests(TestCase):
+    def test_image_required_unless_upload_pending(self):
+        product = make_catalog()[0]
+        image = ProductImage(product=product, image="")
+        with self.assertRaises(ValidationError) as caught:
+            image.full_clean()
+        self.assertIn("image", caught.exception.message_dict)
+
+        image.upload_status = ProductImage.UPLOAD_PENDING
+        image.full_clean()
+        ProductImage(product=product, image="sample/new").full_clean()
+
+
+class JobQueueTests(TestCase):
+    def test_stale_job_on_its_last_attempt_fails(self):
+        stale = timezone.now() - timedelta(seconds=settings.TASK_QUEUE_VISIBILITY_TIMEOUT + 1)
+        retry = Job.objects.create(name="a", status=Job.RUNNING, attempts=1, locked_at=stale)
+        last = Job.objects.create(name="b", status=Job.RUNNING, attempts=5, locked_at=stale)
+
+        self.assertEqual(claim_job(), retry)
+        self.assertIsNone(claim_job())
+        last.refresh_from_db()
+        self.assertEqual(last.status, Job.FAILED)
+        self.assertEqual(last.attempts, 5)
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0.05)
+class ViewCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_catalog()
+
+    def test_view_beacon(self):
+        client = APIClient()
+        product = self.products[0]
+        with mock.patch.object(popularity, "record_view") as record_view:
+            response = client.post(f"/api/products/{product.pk}/view/")
+            self.assertEqual(response.status_code, 204)
+            self.assertIn("no-store", response["Cache-Control"])
+            record_view.assert_called_once_with(product.pk)
+
+            # detail reads may be CDN hits; only the beacon counts
+            client.get(f"/api/products/{product.pk}/")
+            Product.objects.filter(pk=product.pk).update(status=False)
+            self.assertEqual(client.post(f"/api/products/{product.pk}/view/").status_code, 404)
+            self.assertEqual(client.post("/api/products/999999/view/").status_code, 404)
+            record_view.assert_called_once()
+
+    def test_buffer_flushes_without_further_views(self):
+        flushed = threading.Event()
+        with mock.patch.object(popularity, "_flush_in_background", side_effect=flushed.set):
+            popularity.record_view(self.products[1].pk)
+            self.assertTrue(flushed.wait(5))
+        self.assertEqual(popularity.flush(), 1)
+        self.assertEqual(ProductViewCount.objects.get(product=self.products[1]).views, 1)
+
+
+@override_settings(TASK_QUEUE_ENABLED=False, CATALOG_SNAPSHOT_ENABLED=False)
+class RelatedProductTests(TestCase):
+    def setUp(self):
+        # the outbox dispatcher would otherwise start a thread per commit
+        patcher = mock.patch.object(outbox, "schedule_dispatch")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = make_catalog()
+
+    def related_ids(self, product):
+        return list(
+            RelatedProduct.objects.filter(product=product).order_by("rank").values_list("related_id", flat=True)
+        )
+
+    def assert_matches_full_rebuild(self):
+        incremental = {p.pk: self.related_ids(p) for p in Product.objects.all()}
+        rebuild_related()
+        self.assertEqual({p.pk: self.related_ids(p) for p in Product.objects.all()}, incremental)
+
+    def test_status_plan_and_delete_changes_rebuild(self):
+        first, second, third = self.products
+        self.assertIn(second.pk, self.related_ids(first))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=second.pk).save()  # nothing changed
+            second.status = False
+            second.save()
+        self.assertNotIn(second.pk, self.related_ids(first))
+        self.assert_matches_full_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductPlan.objects.filter(product=third).update(price=Decimal("3000"))
+            ProductPlan.objects.filter(product=third).first().save()
+        self.assert_matches_full_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.status = True
+            second.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=second.pk).delete()
+        self.assertEqual(self.related_ids(first), [third.pk])
+        self.assert_matches_full_rebuild()
+
+    def test_related_endpoint_404s_like_retrieve(self):
+        client = APIClient()
+        first, second, _ = self.products
+        self.assertEqual(client.get(f"/api/products/{first.pk}/related/").status_code, 200)
+        Product.objects.filter(pk=first.pk).update(status=False)
+        self.assertEqual(client.get(f"/api/products/{first.pk}/related/").status_code, 404)
+        self.assertEqual(client.get("/api/products/999999/related/").status_code, 404)
+
+
+@override_settings(CATALOG_SNAPSHOT_ENABLED=False)
+class BatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog()
+
+    def test_batch_matches_individual_requests(self):
+        client = APIClient()
+        paths = ["/api/products/", "/api/categories/", "/api/plans/", "/api/products/"]
+        response = client.get("/api/batch/", {"path": paths})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        for path, item in zip(paths, response.json()["responses"]):
+            self.assertEqual(item["status"], 200)
+            self.assertEqual(item["body"], client.get(path).json())
+
+    def test_cache_tags_ignore_the_query_string(self):
+        client = APIClient()
+        self.assertEqual(client.get("/api/products/?page=1&category=ai-ml")["Cache-Tag"], "/api/products/")
+        response = client.get("/api/batch/", {"path": ["/api/products/?page=1", "/api/whatsapp/"]})
+        self.assertEqual(response["Cache-Tag"], "/api/batch/,/api/products/,/api/whatsapp/")
+
+    def test_failed_sub_request_is_not_cacheable(self):
+        response = APIClient().get("/api/batch/", {"path": ["/api/products/", "/api/nope/"]})
+        self.assertEqual([item["status"] for item in response.json()["responses"]], [200, 404])
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+
+    def test_authenticates_once(self):
+        from .authentication import CachedJWTAuthentication
+
+        client = APIClient()
+        client.force_login(get_user_model().objects.create_user("staff", password="x", is_staff=True))
+        with mock.patch.object(
+            CachedJWTAuthentication, "authenticate", autospec=True, return_value=None
+        ) as authenticate:
+            response = client.get("/api/batch/", {"path": ["/api/products/", "/api/plans/"]})
+        self.assertEqual(authenticate.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SITEMAP_CHUNK_SIZE=2, TASK_QUEUE_ENABLED=True)
+class SeoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_catalog()
+
+    def fetch(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_requests_only_serve_stored_artifacts(self):
+        self.assertEqual(self.client.get("/sitemap.xml").status_code, 404)
+        self.assertEqual(self.client.get("/feeds/products.json").status_code, 404)
+        self.assertFalse(SeoArtifact.objects.exists())
+
+    def test_feed_and_sitemaps(self):
+        first_id = self.products[0].pk
+        seo.build()
+        chunks = sorted({(p.pk - 1) // 2 for p in self.products})
+        index = ElementTree.fromstring(self.fetch("/sitemap.xml"))
+        self.assertEqual(len(index), len(chunks) + 1)
+        self.assertIn(f"/product/{first_id}<", self.fetch(f"/sitemap-products-{chunks[0]}.xml"))
+
+        feed = json.loads(self.fetch("/feeds/products.json"))
+        self.assertEqual([item["id"] for item in feed], [p.pk for p in self.products])
+        rss = ElementTree.fromstring(self.fetch("/feeds/products.xml"))
+        self.assertEqual(
+            [int(item.findtext("id")) for item in rss.iter("item")], [p.pk for p in self.products]
+        )
+        self.assertEqual(feed[0]["image_link"], self.products[0].main_image())
+
+    def test_image_change_rewrites_only_its_chunk(self):
+        seo.build()
+        product = self.products[-1]
+        ProductImage.objects.filter(product=product, is_main=False).first().delete()
+        ProductImage.objects.create(product=product, image="sample/new-main", is_main=True)
+
+        self.assertEqual(seo.build(), [f"products-{(product.pk - 1) // 2}"])
+        feed = json.loads(self.fetch("/feeds/products.json"))
+        self.assertIn("sample/new-main", feed[-1]["image_link"])
+
+    def test_catalog_changes_queue_a_build(self):
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(outbox, "schedule_dispatch"):
+            Product.objects.filter(pk=self.products[0].pk).first().save()
+        with mock.patch.object(outbox, "purge_cdn"):
+            outbox.dispatch_all()
+        self.assertTrue(Job.objects.filter(name="build_seo", status=Job.PENDING).exists())
+
+
+class _PurgeHook(BaseHTTPRequestHandler):
+    """Stub CDN purge hook: records each POST and fails the first ``failures``."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.headers.get("Authorization"), body))
+        failing = len(self.server.requests) <= self.server.failures
+        self.send_response(500 if failing else 200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(
+    CDN_PURGE_TOKEN="secret",
+    CDN_PURGE_BATCH_SIZE=4,
+    CDN_PURGE_DELAY=0,
+    OUTBOX_MAX_ATTEMPTS=3,
+    TASK_QUEUE_ENABLED=True,
+)
+class OutboxDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_catalog()
+        OutboxEvent.objects.all().delete()
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _PurgeHook)
+        self.server.requests, self.server.failures = [], 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        hook = override_settings(CDN_PURGE_URL=f"http://127.0.0.1:{self.server.server_port}/purge")
+        hook.enable()
+        self.addCleanup(hook.disable)
+        # dispatched by hand below, not by background threads
+        for name in ("schedule_dispatch", "_dispatch_later"):
+            patcher = mock.patch.object(outbox, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def rename_category(self):
+        category = Category.objects.get(name="Design Tools")
+        category.name = "Design"
+        category.save()
+        return category
+
+    def dispatch_until_settled(self, rounds=10):
+        for _ in range(rounds):
+            outbox.dispatch()
+            # skip the purge delay and retry backoff
+            OutboxEvent.objects.update(next_attempt_at=timezone.now())
+
+    def test_category_purge_payload(self):
+        category = self.rename_category()
+        with mock.patch.object(snapshot, "mark_stale") as mark_stale:
+            self.dispatch_until_settled()
+        mark_stale.assert_called_once()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        purged = [path for auth, body in self.server.requests for path in body["paths"]]
+        self.assertTrue(all(auth == "Bearer secret" for auth, _ in self.server.requests))
+        self.assertTrue(all(body["tags"] == body["paths"] for _, body in self.server.requests))
+        self.assertTrue(all(len(body["paths"]) <= 4 for _, body in self.server.requests))
+        self.assertEqual(len(purged), len(set(purged)))
+        self.assertLessEqual(
+            {"/api/categories/", f"/api/categories/{category.pk}/", "/api/products/", "/api/batch/"},
+            set(purged),
+        )
+        # products embed their categories, so every member's detail is purged
+        for product in self.products:
+            self.assertIn(f"/api/products/{product.pk}/", purged)
+
+    def test_cdn_purge_waits_for_the_local_purge_delay(self):
+        self.rename_category()
+        outbox.dispatch()
+        self.assertEqual(self.server.requests, [])
+        event = OutboxEvent.objects.get()
+        self.assertTrue(event.purged_locally)
+        self.assertEqual(event.attempts, 0)
+
+    def test_retries_until_the_cap(self):
+        self.server.failures = 100
+        self.rename_category()
+        with self.assertLogs("product.outbox", "ERROR") as logs:
+            self.dispatch_until_settled()
+        self.assertIn("Gave up on 1 outbox events after 3 attempts", logs.output[-1])
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 3)
+        self.assertIn("500", event.last_error)
+        # the first chunk fails, so each attempt stops after one request
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(outbox.claim(), [])
+
+    def test_recovers_after_failures(self):
+        self.server.failures = 2
+        self.rename_category()
+        with self.assertLogs("product.outbox", "ERROR"):
+            self.dispatch_until_settled()
+        self.assertFalse(OutboxEvent.objects.exists())
+        failed, delivered = self.server.requests[:2], self.server.requests[2:]
+        self.assertEqual(failed[0], failed[1])
+        self.assertIn(failed[0][1]["paths"][0], delivered[0][1]["paths"])
@@ -0,0 +1,114 @@
+"""
+Throttles for the public API.
+
+DRF's ``SimpleRateThrottle`` keeps a list of timestamps per client and does
+a ``get`` plus a ``set`` on every request. These throttles use GCRA (the
+generic cell rate algorithm, a token bucket kept as a single timestamp):
+each client has a "theoretical arrival time" that every allowed request
+pushes ``duration / num_requests`` seconds further, and a request is
+refused while that time is more than ``duration`` ahead of now. Clients
+can burst up to ``num_requests`` and are then held to the steady rate,
+with no window boundary to game.
+
+With Redis the read-check-write runs as one ``EVAL``, so it is a single
+atomic round trip shared by every worker. Other cache backends have no
+atomic read-modify-write; LocMem is per process anyway, so there a lock
+around ``get``/``set`` makes it atomic.
+
+Clients are identified by ``get_ident()``, which honours
+``REST_FRAMEWORK["NUM_PROXIES"]``. It must match the number of proxies in
+front of the app, or the client-supplied ``X-Forwarded-For`` becomes the key.
+"""
+import math
+import threading
+
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import SimpleRateThrottle
+
+# KEYS[1] = client key; ARGV = now, emission interval, tolerance (seconds).
+# Returns {allowed, seconds to wait}; floats go back as strings because
+# Redis truncates Lua numbers to integers.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then
+    tat = now
+end
+local wait = tat + interval - tolerance - now
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+local ttl = math.ceil((tat + interval - now) * 1000)
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', ttl)
+return {1, '0'}
+"""
+
+_local_lock = threading.Lock()
+
+
+class GCRARateThrottle(SimpleRateThrottle):
+    """GCRA ``SimpleRateThrottle`` with one cache round trip per request."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        interval = self.duration / self.num_requests
+        args = (self.timer(), interval, self.duration)
+        if isinstance(self.cache, RedisCache):
+            allowed, self.retry_after = self.check_redis(*args)
+        else:
+            allowed, self.retry_after = self.check_local(*args)
+        return allowed
+
+    def check_redis(self, now, interval, tolerance):
+        key = self.cache.make_and_validate_key(self.key)
+        client = self.cache._cache.get_client(key, write=True)
+        allowed, wait = client.register_script(GCRA_SCRIPT)(
+            keys=[key], args=[repr(now), repr(interval), repr(tolerance)]
+        )
+        return bool(allowed), float(wait)
+
+    def check_local(self, now, interval, tolerance):
+        with _local_lock:
+            tat = max(self.cache.get(self.key, now), now)
+            wait = tat + interval - tolerance - now
+            if wait > 0:
+                return False, wait
+            self.cache.set(self.key, tat + interval, math.ceil(tat + interval - now))
+            return True, 0.0
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonRateThrottle(GCRARateThrottle):
+    """Limits everyone who isn't staff, keyed by client IP."""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_staff:
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class StaffRateThrottle(GCRARateThrottle):
+    """Limits staff clients (sync jobs, admin tooling), keyed by user."""
+    scope = 'staff'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_staff):
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.user.pk,
+        }
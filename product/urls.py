@@ -8,7 +8,7 @@ from .views import (
     ReviewViewSet,
     WhatsAppSettingsPublicView,
     ProductPlanViewSet,
-
+    BatchView,
 )
 
 router = DefaultRouter()
@@ -21,4 +21,5 @@ router.register(r"plans", ProductPlanViewSet, basename="plan")
 urlpatterns = [
     *router.urls,  # ✅ all router-based endpoints
     path("whatsapp/", WhatsAppSettingsPublicView.as_view(), name="whatsapp-settings"),
+    path("batch/", BatchView.as_view(), name="batch"),
 ]
@@ -1,13 +1,35 @@
+from urllib.parse import urlsplit
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import viewsets, permissions
-from .models import Category, Product, Review, WhatsAppSettings, ProductPlan
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, HttpRequest, QueryDict, StreamingHttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_cache_control
+from . import popularity, seo, snapshot
+from .models import (
+    Category,
+    Product,
+    ProductImage,
+    RelatedProduct,
+    Review,
+    WhatsAppSettings,
+    ProductPlan,
+)
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
     ReviewSerializer,
     WhatsAppSettingsSerializer,
     ProductPlanSerializer,
+    FastCategorySerializer,
+    FastProductSerializer,
+    FastReviewSerializer,
+    FastProductPlanSerializer,
+    related_to_dict,
 )
 
 
@@ -21,10 +43,56 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class FastReadMixin:
+    """Use ``read_serializer_class`` for safe (read-only) requests."""
+    read_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.read_serializer_class is not None and self.request.method in permissions.SAFE_METHODS:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SnapshotReadMixin:
+    """
+    Serve list/retrieve from the catalog snapshot while it is fresh,
+    falling back to the ORM otherwise. Subclasses implement
+    ``snapshot_list(index)`` and ``snapshot_detail(index, pk)``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        index = snapshot.get_index()
+        if index is None:
+            return super().list(request, *args, **kwargs)
+        items = self.snapshot_list(index)
+        page = self.paginate_queryset(items)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(items)
+
+    def retrieve(self, request, *args, **kwargs):
+        index = snapshot.get_index()
+        if index is None:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        item = self.snapshot_detail(index, _int_or_none(kwargs[lookup_url_kwarg]))
+        if item is None:
+            raise Http404
+        return Response(item)
+
+
+class CategoryViewSet(SnapshotReadMixin, FastReadMixin, viewsets.ModelViewSet):
     """CRUD viewset for categories."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    read_serializer_class = FastCategorySerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
@@ -34,25 +102,113 @@ class CategoryViewSet(viewsets.ModelViewSet):
             qs = qs.filter(status=True)
         return qs
 
+    def snapshot_list(self, index):
+        return index.categories
+
+    def snapshot_detail(self, index, pk):
+        return index.categories_by_id.get(pk)
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SnapshotReadMixin, FastReadMixin, viewsets.ModelViewSet):
     """CRUD viewset for products with public read and admin write access."""
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    read_serializer_class = FastProductSerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
-        qs = super().get_queryset().prefetch_related('images', 'reviews', 'categories')
+        qs = super().get_queryset().prefetch_related('images', 'reviews', 'categories', 'plans')
         # Only return active products for public GET requests
         if self.request.method in permissions.SAFE_METHODS:
             qs = qs.filter(status=True)
+            category = self.request.query_params.get('category')
+            if category:
+                qs = qs.filter(categories__slug=category)
+            # same order as the snapshot path, so pages don't shift between the two
+            if self.request.query_params.get('ordering') == 'popular':
+                qs = qs.order_by('-popularity', '-id')
+            else:
+                qs = qs.order_by('id')
         return qs
 
+    def is_public_product(self, product_id):
+        index = snapshot.get_index()
+        if index is not None:
+            return product_id in index.products_by_id
+        return Product.objects.filter(pk=product_id, status=True).exists()
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """Precomputed related products (see product/related.py), one query."""
+        product_id = _int_or_none(pk)
+        # 404 like retrieve, rather than an empty list for unknown products
+        if not self.is_public_product(product_id):
+            raise Http404
+        main_image = (
+            ProductImage.objects.filter(
+                product=OuterRef('related_id'), upload_status=ProductImage.UPLOAD_READY
+            )
+            .exclude(image='')
+            .order_by('-is_main', 'ordering')
+            .values('image')[:1]
+        )
+        rows = (
+            RelatedProduct.objects.filter(product_id=product_id, related__status=True)
+            .order_by('rank')
+            .annotate(main_image=Subquery(main_image))
+            .values(
+                'related_id', 'related__title', 'related__excerpt',
+                'related__price', 'main_image', 'score',
+            )
+        )
+        items = [related_to_dict(row) for row in rows]
+        response = Response(items)
+        # purged along with any of the listed products
+        response[settings.CDN_CACHE_TAG_HEADER] = ','.join(
+            [request.path, *(f"/api/products/{item['id']}/" for item in items)]
+        )
+        return response
+
+    @action(detail=True, methods=['post'], url_path='view',
+            permission_classes=[permissions.AllowAny], authentication_classes=[])
+    def count_view(self, request, pk=None):
+        """
+        Count one view of a product page. The detail GET is usually served
+        by the CDN, so storefronts report views here (e.g. with
+        ``navigator.sendBeacon``) rather than us counting them.
+        """
+        product_id = _int_or_none(pk)
+        if not self.is_public_product(product_id):
+            raise Http404
+        # buffered in-process, flushed to ProductViewCount in batches
+        popularity.record_view(product_id)
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        patch_cache_control(response, no_store=True)
+        return response
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    def snapshot_list(self, index):
+        category = self.request.query_params.get('category')
+        if self.request.query_params.get('ordering') == 'popular':
+            products = index.products_popular
+            if category:
+                products = [
+                    p for p in products
+                    if any(c['slug'] == category for c in p['categories'])
+                ]
+            return products
+        if category:
+            return index.products_by_category.get(category, [])
+        return index.products
+
+    def snapshot_detail(self, index, pk):
+        return index.products_by_id.get(pk)
+
+
+class ReviewViewSet(FastReadMixin, viewsets.ModelViewSet):
     """CRUD viewset for reviews. Reviews are managed by admins only."""
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    read_serializer_class = FastReviewSerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
@@ -62,17 +218,30 @@ class ReviewViewSet(viewsets.ModelViewSet):
             qs = qs.filter(status=True)
         return qs
     
-class ProductPlanViewSet(viewsets.ModelViewSet):
+class ProductPlanViewSet(SnapshotReadMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = ProductPlan.objects.select_related('product')
     serializer_class = ProductPlanSerializer
+    read_serializer_class = FastProductPlanSerializer
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
         qs = super().get_queryset()
         if self.request.method in permissions.SAFE_METHODS:
             qs = qs.filter(is_active=True)
+        if 'product' in self.request.query_params:
+            product_id = _int_or_none(self.request.query_params['product'])
+            qs = qs.filter(product_id=product_id) if product_id is not None else qs.none()
         return qs
 
+    def snapshot_list(self, index):
+        if 'product' in self.request.query_params:
+            product_id = _int_or_none(self.request.query_params['product'])
+            return index.plans_by_product.get(product_id, [])
+        return index.plans
+
+    def snapshot_detail(self, index, pk):
+        return index.plans_by_id.get(pk)
+
 
 class WhatsAppSettingsPublicView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -80,3 +249,104 @@ class WhatsAppSettingsPublicView(APIView):
     def get(self, request):
         obj, _ = WhatsAppSettings.objects.get_or_create(pk=1, defaults={"whatsapp_number": "+923001234567"})
         return Response(WhatsAppSettingsSerializer(obj).data)
+
+
+class BatchView(APIView):
+    """
+    Run several GET requests against the ``product.urls`` API in one round
+    trip. Each sub-request goes through its own view, so permissions and
+    throttles still apply per sub-request; the middleware stack, the DB
+    connection and authentication (one token check and user cache lookup)
+    are only paid for once, and a path listed twice is only run once.
+
+    The batch is only cacheable when every sub-request succeeded; otherwise
+    a CDN would keep serving the errors (e.g. throttled sub-requests).
+
+        GET  /api/batch/?path=/api/products/&path=/api/whatsapp/
+        POST /api/batch/  {"requests": [{"path": "/api/products/?page=2"}]}
+    """
+    permission_classes = [permissions.AllowAny]
+    prefix = '/api/'
+
+    def get(self, request):
+        return self.run(request, request.query_params.getlist('path'))
+
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected {"requests": [{"path": ...}, ...]}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        paths = [item.get('path') if isinstance(item, dict) else item for item in items]
+        return self.run(request, paths)
+
+    def run(self, request, paths):
+        if not paths:
+            return Response({'detail': 'No sub-requests given.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(paths) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {'detail': f'At most {settings.BATCH_MAX_REQUESTS} sub-requests per batch.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = {}
+        responses = []
+        for path in paths:
+            if not isinstance(path, str):
+                responses.append(self.run_one(request, path))
+                continue
+            if path not in results:
+                results[path] = self.run_one(request, path)
+            responses.append(results[path])
+
+        response = Response({'responses': responses})
+        if any(not 200 <= item['status'] < 300 for item in responses):
+            patch_cache_control(response, private=True, no_store=True)
+        else:
+            # purged along with any of its sub-requests' paths
+            tags = dict.fromkeys([request.path, *(urlsplit(path).path for path in paths)])
+            response[settings.CDN_CACHE_TAG_HEADER] = ','.join(tags)
+        return response
+
+    def run_one(self, request, path):
+        if not isinstance(path, str) or not path.startswith(self.prefix):
+            return {'path': path, 'status': 400, 'body': {'detail': f'Path must start with {self.prefix}'}}
+        url = urlsplit(path)
+        try:
+            match = resolve(url.path[len(self.prefix) - 1:], urlconf='product.urls')
+        except Resolver404:
+            return {'path': path, 'status': 404, 'body': {'detail': 'Not found.'}}
+        if getattr(match.func, 'view_class', None) is BatchView:
+            return {'path': path, 'status': 400, 'body': {'detail': 'Batches cannot be nested.'}}
+
+        original = request._request
+        sub = HttpRequest()
+        sub.method = 'GET'
+        sub.path = sub.path_info = url.path
+        sub.META = {**original.META, 'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': url.path, 'QUERY_STRING': url.query}
+        sub.GET = QueryDict(url.query)
+        sub.COOKIES = original.COOKIES
+        sub.resolver_match = match
+        for attr in ('session', 'user'):
+            if hasattr(original, attr):
+                setattr(sub, attr, getattr(original, attr))
+        # reuse the batch's authentication instead of redoing it per sub-request
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+
+        response = match.func(sub, *match.args, **match.kwargs)
+        body = getattr(response, 'data', None)
+        return {'path': path, 'status': response.status_code, 'body': body}
+
+
+SEO_CONTENT_TYPES = {'xml': 'application/xml', 'json': 'application/json'}
+
+
+def seo_artifact(request, name):
+    """Serve a stored sitemap or feed; they are built by the build_seo task."""
+    content = seo.open_artifact(name)
+    if content is None:
+        raise Http404
+    content_type = SEO_CONTENT_TYPES[name.rsplit('.', 1)[1]]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Cache-Control'] = f'public, max-age={settings.SEO_MAX_AGE}'
+    return response